@@ -43,8 +43,10 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'reservations.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'reservations.middleware.ScheduleSnapshotMiddleware',
 ]
 
 ROOT_URLCONF = 'demo2.urls'
@@ -84,6 +86,26 @@ DATABASES = {
     }
 }
 
+# Cache
+# Version stamps are checked on every request, so the cache lives in memory in Redis, shared
+# by every gunicorn worker and the publisher (docker-compose.yml sets REDIS_URL).
+# Without REDIS_URL (local runs and tests), it falls back to the database cache table
+# (created by migration 0040), which is still shared between processes.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'reservations_cache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -119,6 +141,12 @@ STATICFILES_DIRS = [
 # WhiteNoise configuration for static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Pre-rendered public schedule (see reservations.snapshots)
+# WhiteNoise only indexes files when it starts, so ScheduleSnapshotMiddleware serves these;
+# a reverse proxy can serve SCHEDULE_SNAPSHOT_URL straight from this directory too.
+SCHEDULE_SNAPSHOT_ROOT = BASE_DIR / 'snapshots'
+SCHEDULE_SNAPSHOT_URL = '/schedule/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
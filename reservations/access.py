@@ -0,0 +1,96 @@
+# Field Access Matrix
+# Which teams can book which fields, kept as one bitset per team (bit n stands for the
+# n-th active field). The matrix is built from two queries and kept in this process
+# until the 'field_access' version stamp changes (see the Field.teams signals).
+# Edits only write the memberships that changed.
+from django.db import transaction
+
+from reservations.models import Field
+from reservations.utils import VersionedValue
+
+# The Field.teams table (one row per team and field)
+FieldAccess = Field.teams.through
+
+class AccessMatrix(object):
+    def __init__(self, field_ids, memberships):
+        self.field_ids = sorted(field_ids)
+        self.bits = dict((field_id, 1 << bit) for bit, field_id in enumerate(self.field_ids))
+
+        # Format: { team1: 0b101, ... }
+        self.rows = {}
+        for team_id, field_id in memberships:
+            if field_id in self.bits:
+                self.rows[team_id] = self.rows.get(team_id, 0) | self.bits[field_id]
+
+    # Gets the ids of the active fields this team can book
+    def get_fields(self, team_id):
+        row = self.rows.get(team_id, 0)
+
+        fields = []
+        while row:
+            low = row & -row
+            fields.append(self.field_ids[low.bit_length() - 1])
+            row ^= low
+        return fields
+
+    # Gets the ids of the teams that can book this field
+    def get_teams(self, field_id):
+        bit = self.bits.get(field_id, 0)
+        return [team_id for team_id, row in self.rows.items() if row & bit]
+
+    def can_book(self, team_id, field_id):
+        return bool(self.rows.get(team_id, 0) & self.bits.get(field_id, 0))
+
+def load_matrix():
+    return AccessMatrix(Field.objects.filter(active=True).values_list('pk', flat=True), FieldAccess.objects.filter(field__active=True).values_list('user_id', 'field_id'))
+
+_matrix = VersionedValue('field_access', load_matrix)
+
+# Gets the access matrix of every team and active field
+def get_matrix():
+    return _matrix.get()
+
+# Gets the ids of the active fields this team can book
+def get_team_fields(team):
+    return get_matrix().get_fields(team.pk)
+
+# Bumps the matrix's version stamp
+def bump_field_access():
+    _matrix.bump()
+
+""" Edits """
+# Deletes the removed memberships and inserts the added ones (one statement each), and bumps the matrix once
+# Returns whether anything changed
+def write_diff(removed, added):
+    if removed is None and not added:
+        return False
+
+    with transaction.atomic():
+        if removed is not None:
+            removed.delete()
+        if added:
+            FieldAccess.objects.bulk_create(added, ignore_conflicts=True)
+        bump_field_access()
+    return True
+
+# Makes these the only fields a team can book
+def set_team_fields(team, field_ids):
+    field_ids = set(int(pk) for pk in field_ids)
+    current = set(FieldAccess.objects.filter(user=team).values_list('field_id', flat=True))
+
+    removed = current - field_ids
+    return write_diff(
+        FieldAccess.objects.filter(user=team, field_id__in=removed) if removed else None,
+        [FieldAccess(user_id=team.pk, field_id=pk) for pk in field_ids - current]
+    )
+
+# Makes these the only teams that can book a field
+def set_field_teams(field, team_ids):
+    team_ids = set(int(pk) for pk in team_ids)
+    current = set(FieldAccess.objects.filter(field=field).values_list('user_id', flat=True))
+
+    removed = current - team_ids
+    return write_diff(
+        FieldAccess.objects.filter(field=field, user_id__in=removed) if removed else None,
+        [FieldAccess(user_id=pk, field_id=field.pk) for pk in team_ids - current]
+    )
@@ -1,7 +1,14 @@
 from django import forms
+from django.urls import reverse
+from django.db import transaction
+from django.contrib.admin.models import LogEntry, CHANGE
+from django.contrib.contenttypes.models import ContentType
+from django.utils.encoding import force_str
 
 from django.contrib.auth.models import User
-from reservations.models import Field
+from reservations.models import Field, Reservation
+from reservations.utils import bump_cache_version, get_superuser_emails, send_emails
+from reservations.access import set_team_fields, set_field_teams
 
 class APIManagerIDForm(forms.Form):
     manager = forms.ModelChoiceField(widget=forms.HiddenInput(),
@@ -32,19 +39,13 @@ class APITeamModifyFieldsForm(APITeamIDForm):
         self.fields['fields'] = forms.MultipleChoiceField(choices=fields, required=False)
 
     def save(self):
-        if self.cleaned_data.get('fields'):
-            self.cleaned_data.get('team').field_set.set(self.cleaned_data.get('fields'))
-        else:
-            self.cleaned_data.get('team').field_set.clear()
+        set_team_fields(self.cleaned_data.get('team'), self.cleaned_data.get('fields') or [])
 
 class APIFieldModifyTeamsForm(APIFieldIDForm):
     teams = forms.ModelMultipleChoiceField(queryset=User.objects.filter(is_active=True, groups__name='Team'), required=False)
 
     def save(self):
-        if self.cleaned_data.get('teams'):
-            self.cleaned_data.get('field').teams.set(self.cleaned_data.get('teams'))
-        else:
-            self.cleaned_data.get('field').teams.clear()
+        set_field_teams(self.cleaned_data.get('field'), [team.pk for team in self.cleaned_data.get('teams') or []])
 
 class APIGameTypeModifyTeamsForm(APIFieldIDForm):
     teams = forms.ModelMultipleChoiceField(queryset=User.objects.filter(is_active=True, groups__name='Team'), required=False)
@@ -63,3 +64,92 @@ class APIManagerModifyTeamsForm(APIManagerIDForm):
             self.cleaned_data.get('manager').manager_profile.teams.set(self.cleaned_data.get('teams'))
         else:
             self.cleaned_data.get('manager').manager_profile.teams.clear()
+
+class APIApproveReservationsForm(forms.Form):
+    reservations = forms.ModelMultipleChoiceField(queryset=Reservation.objects.filter(active=True),
+        error_messages={
+            'invalid_choice': "One of these reservations does not exist!"
+        })
+    # Unapproves the reservations if not set
+    approved = forms.BooleanField(required=False)
+
+    # Approves/unapproves all of the reservations with one update
+    # The rows are locked first, so two admins approving at once only email and log each change once.
+    # Returns the reservations that changed
+    def save(self, user):
+        approved = self.cleaned_data.get('approved')
+
+        with transaction.atomic():
+            reservations = list(self.cleaned_data.get('reservations').exclude(approved=approved).select_related('team', 'location').select_for_update(of=('self',)))
+            if not reservations:
+                return reservations
+
+            Reservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).update(approved=approved)
+            bump_cache_version('schedule')
+            bump_cache_version('reservations')
+
+            content_type = ContentType.objects.get_for_model(Reservation)
+            entries = []
+            for reservation in reservations:
+                reservation.approved = approved
+                entries.append(LogEntry(
+                    user_id=user.pk,
+                    content_type_id=content_type.pk,
+                    object_id=str(reservation.pk),
+                    object_repr=force_str(reservation)[:200],
+                    action_flag=CHANGE,
+                    change_message="{} Reservation: {} on {}".format("Approved" if approved else "Unapproved", reservation, reservation.date.strftime('%m/%d/%Y'))
+                ))
+            LogEntry.objects.bulk_create(entries)
+
+        # Email the teams (and superusers) about their approved reservations, all over one connection
+        if approved and reservations:
+            superuser_emails = get_superuser_emails()
+            link = reverse('my_reservations')
+
+            emails = []
+            for reservation in reservations:
+                to_emails = [reservation.team.email] if reservation.team.email else []
+                emails.append(("Approved Reservation: {}".format(reservation), 'reservations/email/approve_reservation_done.html', { 'reservation': reservation, 'link': link }, [email for email in superuser_emails if not email in to_emails] + to_emails))
+            send_emails(emails)
+
+        return reservations
+
+# Query filters for the reservation, tournament and team lists
+class APIScheduleFilterForm(forms.Form):
+    start = forms.DateField(required=False, input_formats=['%Y-%m-%d', '%m/%d/%Y'])
+    end = forms.DateField(required=False, input_formats=['%Y-%m-%d', '%m/%d/%Y'])
+    field = forms.IntegerField(required=False)
+    gametype = forms.IntegerField(required=False)
+    team = forms.IntegerField(required=False)
+
+    def filter_reservations(self, reservations):
+        data = self.cleaned_data
+
+        if data.get('start'):
+            reservations = reservations.filter(date__gte=data.get('start'))
+        if data.get('end'):
+            reservations = reservations.filter(date__lte=data.get('end'))
+        if data.get('field') is not None:
+            reservations = reservations.filter(location=data.get('field'))
+        if data.get('gametype') is not None:
+            reservations = reservations.filter(gametype=data.get('gametype'))
+        if data.get('team') is not None:
+            reservations = reservations.filter(team=data.get('team'))
+
+        return reservations
+
+    # Tournaments are kept if they overlap with the date range at all
+    def filter_tournaments(self, tournaments):
+        data = self.cleaned_data
+
+        if data.get('start'):
+            tournaments = tournaments.filter(end_date__gte=data.get('start'))
+        if data.get('end'):
+            tournaments = tournaments.filter(start_date__lte=data.get('end'))
+        if data.get('field') is not None:
+            tournaments = tournaments.filter(locations=data.get('field'))
+        if data.get('gametype') is not None:
+            tournaments = tournaments.filter(gametype=data.get('gametype'))
+
+        return tournaments
@@ -0,0 +1,81 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Keyset (cursor) pagination
+# Pages are ordered by the view's keyset fields (e.g. date, then id), and the cursor holds
+# the keys of the last row of the page, so every page is one indexed range scan however
+# deep it is. Pagination only kicks in when a limit or cursor is given; without them the
+# whole (filtered) list is returned as before.
+class KeysetPagination(BasePagination):
+    default_limit = 100
+    max_limit = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'limit' not in request.query_params and 'cursor' not in request.query_params:
+            return None
+
+        self.request = request
+        self.fields = list(view.keyset)
+        self.limit = self.get_limit(request)
+
+        queryset = queryset.order_by(*self.fields)
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            queryset = queryset.filter(self.get_after(self.decode_cursor(queryset.model, cursor)))
+
+        page = list(queryset[:self.limit + 1])
+        self.next_cursor = None
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            self.next_cursor = self.encode_cursor(page[-1])
+
+        return page
+
+    def get_paginated_response(self, data):
+        next_link = None
+        if self.next_cursor:
+            next_link = replace_query_param(self.request.build_absolute_uri(), 'cursor', self.next_cursor)
+
+        return Response({ 'next': next_link, 'results': data })
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            raise ValidationError({ 'limit': "The limit must be a number!" })
+
+        return max(1, min(limit, self.max_limit))
+
+    # Builds the filter for the rows after the cursor
+    # For keys (a, b): a > x OR (a = x AND b > y)
+    def get_after(self, values):
+        after = None
+        for field, value in reversed(list(zip(self.fields, values))):
+            greater = Q(**{ field + '__gt': value })
+            after = greater if after is None else greater | (Q(**{ field: value }) & after)
+        return after
+
+    # Rows can be model instances or .values() dictionaries
+    def encode_cursor(self, obj):
+        if isinstance(obj, dict):
+            values = [str(obj[field]) for field in self.fields]
+        else:
+            values = [str(getattr(obj, field)) for field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, model, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError()
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, DjangoValidationError):
+            raise ValidationError({ 'cursor': "The cursor is invalid!" })
@@ -3,15 +3,19 @@ from rest_framework.views import APIView
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import generics
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Count, Q
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.exceptions import ValidationError
 from django.contrib import messages
 
 from django.contrib.auth.models import User
 from reservations.models import Reservation, Tournament
 from reservations.decorators import IsSuperuser
-from reservations.utils import clear_tokens
-from reservations.api.forms import APITeamModifyFieldsForm, APIFieldModifyTeamsForm, APIManagerModifyTeamsForm
-from reservations.api.serializers import ReservationSerializer, TournamentSerializer, TeamSerializer
+from reservations.utils import clear_tokens, get_cache_version
+from reservations.api.forms import APITeamModifyFieldsForm, APIFieldModifyTeamsForm, APIManagerModifyTeamsForm, APIApproveReservationsForm, APIScheduleFilterForm
+from reservations.api.pagination import KeysetPagination
+from reservations.api.serializers import ReservationSerializer, TournamentSerializer, TeamSerializer, reservation_values, serialize_reservation_rows
 
 class APIClearTokens(APIView):
     authentication_classes = [SessionAuthentication, BasicAuthentication]
@@ -88,26 +92,98 @@ class APIManagerModifyTeams(APIView):
         else:
             return Response({ 'status': 'error', 'errors': form.errors })
 
-class APIReservationList(generics.ListAPIView):
-    queryset = Reservation.objects.filter(active=True, approved=True).select_related('timeslot', 'team', 'gametype', 'location')
+class APIApproveReservations(APIView):
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsSuperuser]
+
+    def post(self, request, format=None):
+        form = APIApproveReservationsForm(request.POST)
+
+        if form.is_valid():
+            reservations = form.save(request.user)
+
+            messages.success(request._request, "{} <b>{}</b> reservation(s)!".format("Approved" if form.cleaned_data.get('approved') else "Unapproved", len(reservations)))
+            return Response({ 'status': 'success', 'reservations': [reservation.pk for reservation in reservations] })
+        else:
+            return Response({ 'status': 'error', 'errors': form.errors })
+
+# Conditional GETs
+# The ETag comes from the resource's version stamp (bumped by reservations.signals), so a 304
+# never touches the resource's table. There is no Last-Modified: it only has one second
+# resolution, and would answer If-Modified-Since with a 304 after a bump in the same second.
+def conditional(name):
+    def etag(request, *args, **kwargs):
+        return '"{}-{}"'.format(name, get_cache_version(name))
+
+    return method_decorator(condition(etag_func=etag), name='get')
+
+# Lists can be filtered (see APIScheduleFilterForm) and paged (see KeysetPagination)
+class APIScheduleListView(generics.ListAPIView):
+    pagination_class = KeysetPagination
+
+    def get_filter_form(self):
+        form = APIScheduleFilterForm(self.request.query_params)
+        if not form.is_valid():
+            raise ValidationError(form.errors)
+        return form
+
+@conditional('reservations')
+class APIReservationList(APIScheduleListView):
     serializer_class = ReservationSerializer
+    keyset = ('date', 'id')
+
+    def get_queryset(self):
+        reservations = Reservation.objects.filter(active=True, approved=True)
+        return reservation_values(self.get_filter_form().filter_reservations(reservations))
+
+    # Rows are serialized without ReservationSerializer (see serialize_reservation_rows)
+    def list(self, request, *args, **kwargs):
+        rows = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize_reservation_rows(page))
 
+        return Response(serialize_reservation_rows(rows))
+
+@conditional('reservations')
 class APIReservationDetail(generics.RetrieveAPIView):
     queryset = Reservation.objects.filter(active=True, approved=True).select_related('timeslot', 'team', 'gametype', 'location')
     serializer_class = ReservationSerializer
 
-class APITournamentList(generics.ListAPIView):
-    queryset = Tournament.objects.filter(active=True).select_related('gametype')
+@conditional('tournaments')
+class APITournamentList(APIScheduleListView):
     serializer_class = TournamentSerializer
+    keyset = ('start_date', 'id')
+
+    def get_queryset(self):
+        tournaments = Tournament.objects.filter(active=True).select_related('gametype').prefetch_related('locations')
+        return self.get_filter_form().filter_tournaments(tournaments).distinct()
 
+@conditional('tournaments')
 class APITournamentDetail(generics.RetrieveAPIView):
-    queryset = Tournament.objects.filter(active=True).select_related('gametype')
+    queryset = Tournament.objects.filter(active=True).select_related('gametype').prefetch_related('locations')
     serializer_class = TournamentSerializer
 
-class APITeamList(generics.ListAPIView):
-    queryset = User.objects.filter(is_active=True, groups__name='Team').prefetch_related(Prefetch('reservation_set', queryset=Reservation.objects.filter(active=True, approved=True)))
+# Teams are listed with their (filtered) reservations, and the number of them
+class APITeamList(APIScheduleListView):
     serializer_class = TeamSerializer
+    keyset = ('username', 'id')
+
+    def get_queryset(self):
+        form = self.get_filter_form()
+        reservations = form.filter_reservations(Reservation.objects.filter(active=True, approved=True))
+
+        teams = User.objects.filter(is_active=True, groups__name='Team').select_related('profile')
+        if form.cleaned_data.get('team') is not None:
+            teams = teams.filter(pk=form.cleaned_data.get('team'))
+
+        return teams.annotate(
+            reservation_count=Count('reservation', filter=Q(reservation__in=reservations), distinct=True)
+        ).prefetch_related(Prefetch('reservation_set', queryset=reservations))
 
 class APITeamDetail(generics.RetrieveAPIView):
-    queryset = User.objects.filter(is_active=True, groups__name='Team').prefetch_related(Prefetch('reservation_set', queryset=Reservation.objects.filter(active=True, approved=True)))
+    queryset = User.objects.filter(is_active=True, groups__name='Team').select_related('profile').annotate(
+        reservation_count=Count('reservation', filter=Q(reservation__active=True, reservation__approved=True), distinct=True)
+    ).prefetch_related(Prefetch('reservation_set', queryset=Reservation.objects.filter(active=True, approved=True)))
     serializer_class = TeamSerializer
@@ -1,4 +1,8 @@
 from django.apps import AppConfig
 
 class ReservationsConfig(AppConfig):
-    name = 'reservations'
\ No newline at end of file
+    name = 'reservations'
+
+    def ready(self):
+        # Connect signal receivers
+        import reservations.signals
\ No newline at end of file
@@ -0,0 +1,96 @@
+# Availability Index
+# Keeps the AvailabilityBlock table in step with reservations and tournaments,
+# so that the editor can find the open timeslots for a date with one indexed lookup
+# instead of an anti-join across reservations, overlaps and tournaments.
+import datetime
+
+from reservations.models import AvailabilityBlock, Reservation, Tournament, TimeSlot
+
+""" Index Writers """
+# Re-indexes the given reservations (a queryset or a list of reservations)
+# A reservation blocks its own timeslot and every timeslot that overlaps with it.
+def index_reservations(reservations):
+    reservations = list(reservations)
+    if not reservations:
+        return
+
+    AvailabilityBlock.objects.filter(reservation__in=[reservation.pk for reservation in reservations]).delete()
+
+    reservations = [reservation for reservation in reservations if reservation.active]
+    timeslot_ids = set(reservation.timeslot_id for reservation in reservations)
+    if not timeslot_ids:
+        return
+
+    # Format: { timeslot1: set([(timeslot1, field1), (overlap1, field1), ...]), ... }
+    blocked = dict((pk, set()) for pk in timeslot_ids)
+    for pk, location_id in TimeSlot.objects.filter(pk__in=timeslot_ids).values_list('pk', 'location_id'):
+        blocked[pk].add((pk, location_id))
+
+    # Overlaps are stored both ways, but both ways are read, since m2m_changed is sent
+    # before the mirrored rows of a symmetrical add are written.
+    through = TimeSlot.overlap.through
+    overlaps = through.objects.filter(from_timeslot__in=timeslot_ids).values_list('from_timeslot_id', 'to_timeslot_id', 'to_timeslot__location_id')
+    mirrored = through.objects.filter(to_timeslot__in=timeslot_ids).values_list('to_timeslot_id', 'from_timeslot_id', 'from_timeslot__location_id')
+    for timeslot_id, overlap_id, location_id in overlaps.union(mirrored):
+        blocked[timeslot_id].add((overlap_id, location_id))
+
+    blocks = []
+    for reservation in reservations:
+        for timeslot_id, location_id in blocked[reservation.timeslot_id]:
+            blocks.append(AvailabilityBlock(date=reservation.date, location_id=location_id, timeslot_id=timeslot_id, reservation=reservation))
+
+    AvailabilityBlock.objects.bulk_create(blocks)
+
+# Re-indexes a tournament, which closes each of its fields for every day it runs
+def index_tournament(tournament):
+    AvailabilityBlock.objects.filter(tournament=tournament).delete()
+
+    if not tournament.active:
+        return
+
+    location_ids = list(tournament.locations.values_list('pk', flat=True))
+    days = (tournament.end_date - tournament.start_date).days
+
+    blocks = []
+    for offset in range(days + 1):
+        date = tournament.start_date + datetime.timedelta(days=offset)
+        for location_id in location_ids:
+            blocks.append(AvailabilityBlock(date=date, location_id=location_id, tournament=tournament))
+
+    AvailabilityBlock.objects.bulk_create(blocks)
+
+# Re-indexes every active reservation that sits on one of these timeslots
+# Used when a timeslot moves fields or its overlaps change.
+def index_timeslots(timeslot_ids):
+    index_reservations(Reservation.objects.filter(active=True, timeslot__in=timeslot_ids))
+
+# Throws away the index and builds it again from scratch
+def rebuild_index(chunk_size=2000):
+    AvailabilityBlock.objects.all().delete()
+
+    reservations = Reservation.objects.filter(active=True).order_by('pk')
+    chunk = []
+    for reservation in reservations.iterator(chunk_size=chunk_size):
+        chunk.append(reservation)
+        if len(chunk) >= chunk_size:
+            index_reservations(chunk)
+            chunk = []
+    index_reservations(chunk)
+
+    for tournament in Tournament.objects.filter(active=True).iterator(chunk_size=chunk_size):
+        index_tournament(tournament)
+
+""" Index Readers """
+# Gets what is blocked on a date
+# Returns (blocked timeslot ids, closed field ids)
+def get_blocked(date):
+    timeslots = set()
+    fields = set()
+
+    for location_id, timeslot_id in AvailabilityBlock.objects.filter(date=date).values_list('location_id', 'timeslot_id'):
+        if timeslot_id:
+            timeslots.add(timeslot_id)
+        else:
+            fields.add(location_id)
+
+    return timeslots, fields
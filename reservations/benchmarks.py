@@ -0,0 +1,224 @@
+# Editor Load Harness
+# Seeds a realistic league and drives simulated teams, side by side, through the three-step
+# reservation editor (new_reservation -> step 1 -> step 2 -> step 3 -> complete) with the
+# Django test client. Reports the latency percentiles and query counts of every step, and
+# how often teams lost out on a hold or a timeslot to each other.
+# Run it with the benchmark_editor command, which does all of this in a throwaway database.
+import datetime
+import random
+import threading
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from reservations.models import Reservation, Tournament, Field, TimeSlot, GameType, TeamProfile
+from reservations.availability import rebuild_index
+from reservations.holds import get_held_fields
+from reservations.overlap import get_time_range
+from reservations.access import bump_field_access
+
+# How a flow through the editor can end
+OUTCOMES = ['booked', 'held', 'taken', 'error']
+
+""" Seeding """
+# Seeds a league: teams (each allowed on a few fields), fields with back-to-back timeslots,
+# and a season of reservations and tournaments centered on today
+# Returns what the simulated users need: { 'teams': [...], 'team_fields': { team1: [field1, ...] }, 'timeslots': { field1: [timeslot1, ...] }, 'gametype': gametype1 }
+def seed_league(teams=200, fields=20, timeslots=6, weeks=26, tournaments=20, density=0.3, seed=0):
+    rng = random.Random(seed)
+    today = timezone.localtime(timezone.now()).date()
+
+    gametypes = GameType.objects.bulk_create([GameType(type=name) for name in ("Game", "Practice", "Scrimmage")])
+
+    # Teams can't log in with a password; the simulated users are logged in with force_login
+    users = User.objects.bulk_create([User(username="team{}".format(number), email="team{}@example.com".format(number), password=make_password(None)) for number in range(teams)])
+    group = Group.objects.get(name='Team')
+    User.groups.through.objects.bulk_create([User.groups.through(user_id=user.pk, group_id=group.pk) for user in users])
+    profiles = TeamProfile.objects.bulk_create([TeamProfile(team=user, age="U{}".format(8 + number % 10), gender=rng.choice(['boys', 'girls'])) for number, user in enumerate(users)])
+    profiles = dict((profile.team_id, profile) for profile in profiles)
+
+    field_list = Field.objects.bulk_create([Field(name="Field {}".format(number + 1)) for number in range(fields)])
+
+    # Format: { field1: [team1, team2, ...], ... }
+    field_teams = dict((field.pk, []) for field in field_list)
+    memberships = []
+    for user in users:
+        for field in rng.sample(field_list, min(3, len(field_list))):
+            field_teams[field.pk].append(user)
+            memberships.append(Field.teams.through(field_id=field.pk, user_id=user.pk))
+    Field.teams.through.objects.bulk_create(memberships)
+    bump_field_access()
+
+    # Back-to-back two hour timeslots from 8 AM, so none of them overlap
+    slots = []
+    for field in field_list:
+        for number in range(timeslots):
+            start = datetime.time(hour=(8 + number * 2) % 24)
+            end = datetime.time(hour=(10 + number * 2) % 24)
+            slots.append(TimeSlot(location=field, start_time=start, end_time=end))
+    TimeSlot.objects.bulk_create(slots)
+
+    field_timeslots = dict((field.pk, []) for field in field_list)
+    for timeslot in slots:
+        field_timeslots[timeslot.location_id].append(timeslot)
+
+    season_start = today - datetime.timedelta(weeks=weeks / 2)
+    reservations = []
+    for day in range(weeks * 7):
+        date = season_start + datetime.timedelta(days=day)
+        for timeslot in slots:
+            if rng.random() >= density or not field_teams[timeslot.location_id]:
+                continue
+
+            team = rng.choice(field_teams[timeslot.location_id])
+            reservations.append(Reservation(
+                game_number=rng.randint(1, 999), game_opponent="Opponent", date=date, team=team, team_name=team.username,
+                location_id=timeslot.location_id, gametype=rng.choice(gametypes), timeslot=timeslot, time_range=get_time_range(timeslot),
+                approved=rng.random() < 0.9, age=profiles[team.pk].age, gender=profiles[team.pk].gender
+            ))
+    Reservation.objects.bulk_create(reservations, batch_size=2000)
+
+    tournament_list = []
+    for number in range(tournaments):
+        start_date = season_start + datetime.timedelta(days=rng.randrange(weeks * 7))
+        tournament_list.append(Tournament(name="Tournament {}".format(number + 1), start_date=start_date, end_date=start_date + datetime.timedelta(days=rng.randint(0, 2)), gametype=rng.choice(gametypes)))
+    Tournament.objects.bulk_create(tournament_list)
+    Tournament.locations.through.objects.bulk_create([Tournament.locations.through(tournament_id=tournament.pk, field_id=rng.choice(field_list).pk) for tournament in tournament_list])
+
+    rebuild_index()
+
+    return {
+        'teams': users,
+        'team_fields': dict((user.pk, [field for field, members in field_teams.items() if user in members]) for user in users),
+        'timeslots': field_timeslots,
+        'gametype': gametypes[0]
+    }
+
+""" Simulation """
+# Walks one team through the editor for a date and timeslot
+# Returns (outcome, [(step, seconds, queries), ...])
+def run_flow(client, team, date, timeslot, gametype):
+    steps = []
+
+    def request(step, method, name, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(reverse(name), data, secure=True)
+            steps.append((step, time.perf_counter() - start, len(queries)))
+        return response
+
+    def redirected_to(response, name):
+        return response.status_code == 302 and response.url == reverse(name)
+
+    if not redirected_to(request('new_reservation', 'get', 'new_reservation'), 'editor_step1'):
+        return 'error', steps
+
+    request('editor_step1', 'get', 'editor_step1')
+    response = request('editor_step1 (post)', 'post', 'editor_step1', {
+        'game_number': 1, 'game_opponent': "Opponent", 'gametype': gametype.pk, 'team': team.pk, 'date': date.strftime('%m/%d/%Y')
+    })
+    if not redirected_to(response, 'editor_step2'):
+        return 'error', steps
+
+    response = request('editor_step2', 'get', 'editor_step2')
+    if response.status_code != 200:
+        return 'error', steps
+
+    # The field is hidden while another team holds it, and the timeslot while it is reserved
+    # (The page is read rather than response.context, which other threads' renders leak into.)
+    if 'id="timeslot-{}"'.format(timeslot.pk) not in response.content.decode():
+        return ('held' if timeslot.location_id in get_held_fields(date, team) else 'taken'), steps
+
+    response = request('editor_step2 (post)', 'post', 'editor_step2', { 'timeslot': timeslot.pk })
+    if redirected_to(response, 'editor_step2'):
+        return 'held', steps
+    if response.status_code == 200:
+        return 'taken', steps
+    if not redirected_to(response, 'editor_step3'):
+        return 'error', steps
+
+    response = request('editor_step3', 'get', 'editor_step3')
+    if response.status_code != 200:
+        return 'held', steps
+
+    response = request('editor_complete', 'get', 'editor_complete')
+    if redirected_to(response, 'my_reservations'):
+        return 'booked', steps
+    if redirected_to(response, 'editor_step2'):
+        return 'taken', steps
+    return 'error', steps
+
+# Runs the simulated users side by side, each as its own team with its own client
+# They all book within the same few days (starting two weeks out, past any editing block),
+# so they fight over the same holds and timeslots.
+# Returns { 'seconds': total, 'outcomes': { outcome1: count, ... }, 'steps': { step1: [(seconds, queries), ...], ... } }
+def run_benchmark(league, users=10, rounds=5, days=3, seed=0):
+    first_day = timezone.localtime(timezone.now()).date() + datetime.timedelta(days=14)
+    teams = [team for team in league['teams'] if league['team_fields'][team.pk]]
+
+    outcomes = dict((outcome, 0) for outcome in OUTCOMES)
+    steps = {}
+    lock = threading.Lock()
+
+    def simulate(number):
+        rng = random.Random(seed + number)
+        team = teams[number % len(teams)]
+        client = Client()
+        client.force_login(team)
+
+        try:
+            for _ in range(rounds):
+                date = first_day + datetime.timedelta(days=rng.randrange(days))
+                timeslot = rng.choice(league['timeslots'][rng.choice(league['team_fields'][team.pk])])
+                outcome, flow_steps = run_flow(client, team, date, timeslot, league['gametype'])
+
+                with lock:
+                    outcomes[outcome] += 1
+                    for step, seconds, queries in flow_steps:
+                        steps.setdefault(step, []).append((seconds, queries))
+        finally:
+            # Every thread has its own connection
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    start = time.perf_counter()
+    if users == 1:
+        simulate(0)
+    else:
+        threads = [threading.Thread(target=simulate, args=(number,)) for number in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return { 'seconds': time.perf_counter() - start, 'outcomes': outcomes, 'steps': steps }
+
+""" Reporting """
+# Nearest-rank percentile of a list of numbers
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(0, int(round(percent / 100.0 * len(values))) - 1)]
+
+# Formats a benchmark report as lines of text
+def format_report(report):
+    flows = sum(report['outcomes'].values())
+    lines = ["{} flows in {:.1f}s ({:.1f} flows/s)".format(flows, report['seconds'], flows / report['seconds'] if report['seconds'] else 0), ""]
+
+    lines.append("{:<22}{:>8}{:>10}{:>10}{:>10}{:>10}".format("Step", "Count", "p50 ms", "p90 ms", "p99 ms", "Queries"))
+    for step, samples in report['steps'].items():
+        seconds = [sample[0] * 1000 for sample in samples]
+        queries = [sample[1] for sample in samples]
+        lines.append("{:<22}{:>8}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}".format(step, len(samples), percentile(seconds, 50), percentile(seconds, 90), percentile(seconds, 99), sum(queries) / float(len(queries))))
+
+    lines.append("")
+    for outcome in OUTCOMES:
+        count = report['outcomes'][outcome]
+        lines.append("{:<22}{:>8}{:>9.1f}%".format(outcome.capitalize(), count, 100.0 * count / flows if flows else 0))
+
+    return lines
@@ -0,0 +1,252 @@
+# Database Cleanup
+# Archives old reservations and cleans out inactive and/or out-of-date
+# reservations, gametypes, fields, timeslots and teams.
+# Run it weekly with the clean_database command; the clean_task decorator only
+# falls back to it when the week has rolled over without a clean.
+import datetime
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.db.models import Exists, OuterRef, Q, F
+
+from django.contrib.auth.models import User
+
+from reservations.models import Reservation, ArchivedReservation, Field, TimeSlot, GameType, Tournament, ArchivedTournament, AvailabilityBlock, OutboundEmail
+from reservations.availability import index_reservations
+from reservations.utils import get_website_setting, set_website_setting, date_bounds, bump_cache_version
+from reservations.holds import purge_expired_holds
+from reservations.outbox import OUTBOX_MAX_ATTEMPTS
+
+# How many rows are archived per batch (and per transaction)
+CLEAN_CHUNK_SIZE = 2000
+
+# Stops two workers from cleaning at the same time
+CLEAN_LOCK = 'lock:clean_database'
+CLEAN_LOCK_TIMEOUT = 60 * 60
+
+""" Archivers """
+# Deletes rows by primary key with one statement, without loading them or sending delete signals
+# The rows that point at them must be deleted first, and the callers bump the version stamps
+# the signals would have (once per chunk instead of once per row).
+def delete_rows(model, pks):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM {} WHERE {} = ANY(%s)".format(quote(model._meta.db_table), quote(model._meta.pk.column)), [pks])
+
+# Moves every reservation before this date into the archive
+# Returns how many reservations were archived
+def archive_reservations(before, chunk_size=CLEAN_CHUNK_SIZE):
+    reservations = Reservation.objects.filter(date__lt=before).order_by('pk').values_list(
+        'pk', 'game_number', 'game_opponent', 'date', 'approved', 'team_name',
+        'location__name', 'gametype__type', 'timeslot__start_time', 'timeslot__end_time', 'active', 'age', 'gender'
+    )
+
+    count = 0
+    while True:
+        with transaction.atomic():
+            rows = list(reservations[:chunk_size])
+            if not rows:
+                break
+
+            archives = []
+            for pk, game_number, game_opponent, date, approved, team_name, location, gametype, start_time, end_time, active, age, gender in rows:
+                archives.append(ArchivedReservation(
+                    game_number=game_number,
+                    game_opponent=game_opponent,
+                    date=date,
+                    approved=approved,
+                    team=team_name,
+                    location=location,
+                    gametype=gametype,
+                    start_time=start_time,
+                    end_time=end_time,
+                    deleted=not active,
+                    age=age,
+                    gender=gender
+                ))
+
+            ArchivedReservation.objects.bulk_create(archives)
+
+            pks = [row[0] for row in rows]
+            AvailabilityBlock.objects.filter(reservation__in=pks).delete()
+            delete_rows(Reservation, pks)
+            bump_cache_version('schedule')
+            bump_cache_version('reservations')
+
+        count += len(rows)
+
+    return count
+
+# Moves every inactive tournament into the archive
+# Returns how many tournaments were archived
+def archive_tournaments(chunk_size=CLEAN_CHUNK_SIZE):
+    tournaments = Tournament.objects.filter(active=False).order_by('pk').select_related('gametype').prefetch_related('locations')
+
+    count = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(tournaments[:chunk_size])
+            if not chunk:
+                break
+
+            archives = []
+            for tournament in chunk:
+                archives.append(ArchivedTournament(
+                    name=tournament.name,
+                    start_date=tournament.start_date,
+                    end_date=tournament.end_date,
+                    gametype=tournament.gametype.type if tournament.gametype else "",
+                    locations=",".join([x.name for x in tournament.locations.all()])
+                ))
+
+            ArchivedTournament.objects.bulk_create(archives)
+
+            pks = [tournament.pk for tournament in chunk]
+            AvailabilityBlock.objects.filter(tournament__in=pks).delete()
+            Tournament.locations.through.objects.filter(tournament__in=pks).delete()
+            delete_rows(Tournament, pks)
+            bump_cache_version('schedule')
+            bump_cache_version('tournaments')
+
+        count += len(chunk)
+
+    return count
+
+""" Cleaners """
+# Each cleaner removes its unused inactive rows with one anti-join delete,
+# and returns how many rows it removed
+def delete_count(queryset):
+    return queryset.delete()[1].get(queryset.model._meta.label, 0)
+
+def clean_gametypes():
+    return delete_count(GameType.objects.filter(active=False).filter(
+        ~Exists(Reservation.objects.filter(gametype=OuterRef('pk'))),
+        ~Exists(Tournament.objects.filter(gametype=OuterRef('pk')))
+    ))
+
+def clean_timeslots():
+    return delete_count(TimeSlot.objects.filter(active=False).filter(
+        ~Exists(Reservation.objects.filter(timeslot=OuterRef('pk')))
+    ))
+
+def clean_fields():
+    return delete_count(Field.objects.filter(active=False).filter(
+        ~Exists(Reservation.objects.filter(location=OuterRef('pk'))),
+        ~Exists(Tournament.locations.through.objects.filter(field=OuterRef('pk')))
+    ))
+
+def clean_teams():
+    return delete_count(User.objects.filter(is_active=False).filter(
+        ~Exists(Reservation.objects.filter(team=OuterRef('pk')))
+    ))
+
+# Removes emails that were sent (or given up on) a while ago
+def clean_emails():
+    return delete_count(OutboundEmail.objects.filter(created__lt=timezone.now() - datetime.timedelta(days=30)).filter(
+        Q(sent__isnull=False) | Q(attempts__gte=OUTBOX_MAX_ATTEMPTS)
+    ))
+
+""" Compaction """
+# Merges duplicate timeslots (same field, start and end) into one canonical timeslot
+# The canonical one is the active one, or else the oldest. Reservations are moved onto it,
+# and it takes over the duplicates' overlaps. Active timeslots are never merged away.
+# Returns how many duplicates were removed
+def compact_timeslots():
+    duplicates = TimeSlot.objects.filter(Exists(
+        TimeSlot.objects.filter(location=OuterRef('location'), start_time=OuterRef('start_time'), end_time=OuterRef('end_time')).exclude(pk=OuterRef('pk'))
+    )).order_by('location', 'start_time', 'end_time', '-active', 'pk').values_list('pk', 'location', 'start_time', 'end_time', 'active')
+
+    # Format: { duplicate1: canonical1, ... }
+    canonical = {}
+    group = None
+    for pk, location, start_time, end_time, active in duplicates:
+        if group != (location, start_time, end_time):
+            group = (location, start_time, end_time)
+            group_canonical = pk
+        elif not active:
+            canonical[pk] = group_canonical
+
+    if not canonical:
+        return 0
+
+    with transaction.atomic():
+        # Reservations that are on (or blocked by) a duplicate need to be re-indexed afterwards
+        affected = set(Reservation.objects.filter(timeslot__in=canonical.keys()).values_list('pk', flat=True))
+        affected.update(AvailabilityBlock.objects.filter(timeslot__in=canonical.keys(), reservation__isnull=False).values_list('reservation', flat=True))
+
+        # Move the duplicates' overlaps onto their canonical timeslot (both ways, since overlap is symmetrical)
+        through = TimeSlot.overlap.through
+        edges = set()
+        for from_id, to_id in through.objects.filter(from_timeslot__in=canonical.keys()).values_list('from_timeslot_id', 'to_timeslot_id'):
+            from_id = canonical[from_id]
+            to_id = canonical.get(to_id, to_id)
+            if from_id != to_id:
+                edges.add((from_id, to_id))
+                edges.add((to_id, from_id))
+        through.objects.bulk_create([through(from_timeslot_id=from_id, to_timeslot_id=to_id) for from_id, to_id in edges], ignore_conflicts=True)
+
+        # Format: { canonical1: [duplicate1, duplicate2], ... }
+        merges = {}
+        for duplicate, pk in canonical.items():
+            merges.setdefault(pk, []).append(duplicate)
+        for pk, merged in merges.items():
+            Reservation.objects.filter(timeslot__in=merged).update(timeslot=pk)
+
+        count = delete_count(TimeSlot.objects.filter(pk__in=canonical.keys()))
+        index_reservations(Reservation.objects.filter(pk__in=affected))
+
+    return count
+
+# Removes stored overlaps between timeslots that do not actually overlap
+# Saving a timeslot keeps its overlaps in step (see reservations.overlap), so these
+# only come from fixtures or older data.
+# Returns how many overlaps were removed (each one is stored both ways)
+def prune_overlaps():
+    through = TimeSlot.overlap.through
+    stale = through.objects.filter(
+        ~Q(from_timeslot__location=F('to_timeslot__location')) |
+        Q(from_timeslot__start_time__gte=F('to_timeslot__end_time')) |
+        Q(from_timeslot__end_time__lte=F('to_timeslot__start_time'))
+    )
+    return delete_count(stale) // 2
+
+""" Cleanup """
+# Returns whether the week has rolled over since the last clean
+def clean_due():
+    last_clean_date = datetime.datetime.strptime(get_website_setting('LAST_CLEAN_DATE', '01/01/2016'), '%m/%d/%Y').date()
+    return date_bounds()['start'] > last_clean_date
+
+# Cleans up the database, if it is due (or forced)
+# Returns a report of how many rows were archived/removed, or None if nothing ran
+def clean_database(force=False, chunk_size=CLEAN_CHUNK_SIZE):
+    if not force and not clean_due():
+        return None
+
+    # Another worker is already cleaning
+    if not cache.add(CLEAN_LOCK, True, CLEAN_LOCK_TIMEOUT):
+        return None
+
+    try:
+        clean_date = date_bounds()['start']
+
+        report = {
+            'reservations': archive_reservations(clean_date, chunk_size),
+            'tournaments': archive_tournaments(chunk_size)
+        }
+
+        report['timeslots_merged'] = compact_timeslots()
+
+        with transaction.atomic():
+            report['gametypes'] = clean_gametypes()
+            report['timeslots'] = clean_timeslots()
+            report['fields'] = clean_fields()
+            report['teams'] = clean_teams()
+            report['overlaps'] = prune_overlaps()
+            report['holds'] = purge_expired_holds()
+            report['emails'] = clean_emails()
+
+            set_website_setting('LAST_CLEAN_DATE', clean_date.strftime('%m/%d/%Y'))
+    finally:
+        cache.delete(CLEAN_LOCK)
+
+    return report
@@ -7,8 +7,12 @@ from django.utils import timezone
 from datetime import datetime
 
 from django.contrib.auth.models import User
-from reservations.models import Reservation, GameType, TimeSlot, Field, Tournament
+from reservations.models import Reservation, GameType, TimeSlot, Field
 from reservations.utils import is_superuser, is_manager
+from reservations.availability import get_blocked
+from reservations.holds import get_held_fields
+from reservations.access import get_team_fields
+from reservations.overlap import sync_overlaps
 
 class EditorStep1Form(forms.Form):
     game_number = forms.IntegerField(error_messages={
@@ -150,11 +154,11 @@ class EditorStep2Form(forms.Form):
         # And give that queryset to the form.
         # Also check if this is an edit. If so, get the existing reservation.
 
-        # Get all reservations that occur on this date
-        already_reserved = Reservation.objects.filter(active=True, date=date)
+        # Get the timeslots and fields blocked on this date by reservations (and their overlaps) and tournaments
+        blocked_timeslots, closed_fields = get_blocked(date)
 
-        # Get all tournaments that intersect with this date
-        tournaments = Tournament.objects.filter(active=True, start_date__lte=date, end_date__gte=date)
+        # Also hide fields that other teams are holding on this date
+        closed_fields |= get_held_fields(date, request.user)
 
         # Let them see the timeslot this reservation occupies
         resv_timeslot = get_object_or_none(TimeSlot, pk=request.session.get('resv_timeslot', -1))
@@ -172,25 +176,15 @@ class EditorStep2Form(forms.Form):
             else:
                 timeslot_pk = resv_timeslot.pk
 
+        # Get active timeslots that aren't blocked on this date, or the current timeslot.
+        available = Q(active=True) & ~Q(pk__in=blocked_timeslots) & ~Q(location__in=closed_fields)
+
         if not is_superuser(request.user):
-            # Get timeslots where the team is allowed to sign up, and exclude those that already have a reservation or a tournament going on.
-            choices = TimeSlot.objects.filter(
-                (
-                    Q(active=True) &                                                 # It's an active timeslot
-                    Q(location__in=team.field_set.filter(active=True)) &             # This team can use this timeslot's field
-                    ~Q(reservation__in=already_reserved) &                           # This timeslot doesn't have a reservation yet
-                    ~Q(overlap__reservation__in=already_reserved) &                  # This custom timeslot doesn't overlap with reservations
-                    ~Q(location__tournament__in=tournaments)                         # Tournaments aren't taking place this day.
-                ) | Q(pk=timeslot_pk)).distinct().order_by('location', 'start_time') # Or if this is the current timeslot.
-        else:
-            # They are a superuser, let them choose any timeslot.
-            choices = TimeSlot.objects.filter(
-                (
-                    Q(active=True) &
-                    ~Q(reservation__in=already_reserved) &
-                    ~Q(overlap__reservation__in=already_reserved) &
-                    ~Q(location__tournament__in=tournaments)
-                ) | Q(pk=timeslot_pk)).distinct().order_by('location', 'start_time')
+            # Only get timeslots where the team is allowed to sign up.
+            available &= Q(location__in=get_team_fields(team))
+
+        # Superusers can choose any timeslot.
+        choices = TimeSlot.objects.filter(available | Q(pk=timeslot_pk)).select_related('location').order_by('location', 'start_time')
 
         self.fields['timeslot'].queryset = choices
 
@@ -237,12 +231,16 @@ class EditorStep2Form(forms.Form):
                 return False
 
             field = get_object_or_404(Field, pk=self.field)
-            timeslot = TimeSlot(active=False, start_time=self.start_time, end_time=self.end_time, location=field)
-            timeslot.save()
 
-            # Add overlapping active timeslots
-            overlap = TimeSlot.objects.filter(active=True, location=timeslot.location, start_time__lt=timeslot.end_time, end_time__gt=timeslot.start_time)
-            timeslot.overlap.add(*overlap)
+            # Reuse the same timeslot if it already exists (preferring an active one)
+            timeslot = TimeSlot.objects.filter(location=field, start_time=self.start_time, end_time=self.end_time).order_by('-active', 'pk').first()
+            if not timeslot:
+                # Saving it stores its overlaps (see reservations.overlap)
+                timeslot = TimeSlot(active=False, start_time=self.start_time, end_time=self.end_time, location=field)
+                timeslot.save()
+            else:
+                # Timeslots added since it was saved may be missing from its overlaps
+                sync_overlaps(timeslot)
 
             request.session['resv_timeslot'] = timeslot.pk
             request.session['resv_location'] = field.pk
@@ -1,7 +1,8 @@
 from django.forms import ModelForm
 from django import forms
 
-from reservations.models import Field, TimeSlot
+from reservations.models import Field, TimeSlot, Reservation
+from reservations.overlap import get_conflicts
 
 class FieldForm(ModelForm):
     class Meta:
@@ -39,20 +40,28 @@ class TimeSlotForm(ModelForm):
                 raise forms.ValidationError("The start time must be before the end time!")
 
             if self.instance.location:
-                for timeslot in self.instance.location.timeslot_set.filter(active=True):
+                for timeslot in self.instance.location.timeslot_set.filter(active=True).exclude(pk=self.instance.pk):
                     if timeslot.start_time < end_time and timeslot.end_time > start_time:
                         raise forms.ValidationError("The timeslot you have chosen intersects with an existing timeslot!")
 
+            # The new times can't make this timeslot's reservations overlap with others
+            # (the reservation_no_overlap constraint would turn the save away)
+            if self.instance.pk:
+                moved = TimeSlot(pk=self.instance.pk, location_id=self.instance.location_id, start_time=start_time, end_time=end_time)
+                reservations = Reservation.objects.filter(active=True, timeslot=self.instance)
+                ids = list(reservations.values_list('pk', flat=True))
+
+                for date in reservations.values_list('date', flat=True).distinct():
+                    if get_conflicts(date, moved, exclude=ids).exists():
+                        raise forms.ValidationError("The new times overlap with another reservation on {}!".format(date.strftime('%m/%d/%Y')))
+
         return cleaned_data
 
     def save(self, commit=True):
         timeslot = super(TimeSlotForm, self).save(commit=False)
 
+        # Saving it stores its overlaps (see reservations.overlap)
         if commit:
             timeslot.save()
 
-            # Add overlapping custom timeslots
-            overlap = TimeSlot.objects.filter(active=False, location=timeslot.location, start_time__lt=timeslot.end_time, end_time__gt=timeslot.start_time)
-            timeslot.overlap.add(*overlap)
-
         return timeslot
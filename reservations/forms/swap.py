@@ -1,6 +1,8 @@
 from django import forms
+from django.db import IntegrityError
 
 from reservations.models import Reservation
+from reservations.overlap import get_conflicts, is_conflict, deferred_overlap_check
 
 class SwapForm(forms.Form):
     def __init__(self, *args, **kwargs):
@@ -27,19 +29,35 @@ class SwapForm(forms.Form):
                 else:
                     raise forms.ValidationError("You gave two (or more) reservations the same timeslot. Try again!")
 
+        # Check that no timeslot overlaps with a reservation outside of the swap
+        for field, reservation in cleaned_data.items():
+            if field.startswith('swap-with-'):
+                if get_conflicts(reservation.date, reservation.timeslot, exclude=matched).exists():
+                    raise forms.ValidationError("The timeslot of {} overlaps with another reservation. Try again!".format(reservation))
+
+    # Returns the swapped reservations, or None (with a form error) if another reservation got in the way
     def save(self):
         # Swap! We're taking advantage of the fact that we've got two different objects
         # that point to the same thing.
         swapped_reservations = []
 
-        for field, reservation in self.cleaned_data.items():
-            if field.startswith('swap-with-'):
-                original = self.fields[field].initial
-
-                original.date = reservation.date
-                original.timeslot = reservation.timeslot
-
-                original.save()
-                swapped_reservations.append(original)
+        try:
+            # The reservations overlap each other halfway through, so only check them once all are saved
+            with deferred_overlap_check():
+                for field, reservation in self.cleaned_data.items():
+                    if field.startswith('swap-with-'):
+                        original = self.fields[field].initial
+
+                        original.date = reservation.date
+                        original.timeslot = reservation.timeslot
+                        original.location = reservation.location
+
+                        original.save()
+                        swapped_reservations.append(original)
+        except IntegrityError as error:
+            if not is_conflict(error):
+                raise
+            self.add_error(None, "One of the timeslots was just reserved by another reservation. Try again!")
+            return None
 
         return swapped_reservations
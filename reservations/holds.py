@@ -0,0 +1,67 @@
+# Reservation Holds
+# A team holds a field for a date while it finishes a reservation. Holds are rows
+# in ReservationToken (one per date and field), so teams booking different fields
+# never wait on each other. Expired holds are not swept; they are handed over to
+# the next team that asks for the field.
+import datetime
+
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from reservations.models import ReservationToken
+from reservations.utils import get_website_setting
+
+# Gets how long a hold lasts (in minutes)
+def get_hold_timeout():
+    return int(get_website_setting('RESERVATION_TOKEN_TIMEOUT', 10))
+
+# Gets the time before which holds are expired
+def get_hold_expiry():
+    return timezone.now() - datetime.timedelta(minutes=get_hold_timeout())
+
+# Tries to hold a field for a date
+# Returns (True, hold) if this user has the hold, or (False, hold) with the hold that is in the way.
+def acquire_hold(user, date, location_id):
+    expiry = get_hold_expiry()
+
+    with transaction.atomic():
+        # A team only holds one field at a time
+        ReservationToken.objects.filter(team=user).exclude(hold_date=date, location_id=location_id).delete()
+
+        # Skip the row if another request is taking it right now
+        hold = ReservationToken.objects.select_for_update(skip_locked=True).filter(hold_date=date, location_id=location_id).first()
+
+        if not hold:
+            try:
+                with transaction.atomic():
+                    hold = ReservationToken.objects.create(team=user, hold_date=date, location_id=location_id)
+                return True, hold
+            except IntegrityError:
+                # Somebody else got it first
+                return False, ReservationToken.objects.filter(hold_date=date, location_id=location_id).first()
+
+        if hold.issued < expiry:
+            # Hand the expired hold over
+            hold.team = user
+            hold.issued = timezone.now()
+            hold.save(update_fields=['team', 'issued'])
+            return True, hold
+
+        return hold.team_id == user.pk, hold
+
+# Gets the fields held by other teams on a date
+def get_held_fields(date, user):
+    return set(ReservationToken.objects.filter(hold_date=date, issued__gte=get_hold_expiry()).exclude(team=user).exclude(location=None).values_list('location_id', flat=True))
+
+# Deletes holds that have expired
+def purge_expired_holds():
+    return ReservationToken.objects.filter(issued__lt=get_hold_expiry()).delete()[0]
+
+# Gets the warning shown when a hold is in the way
+def get_hold_message(hold):
+    if not hold:
+        return "Another team is currently making a reservation on this field! Try again in a minute."
+
+    # Gets the minutes left by subtracting the hold's age from the timeout
+    minutes_left = get_hold_timeout() - int((timezone.now() - hold.issued).total_seconds() / 60)
+    return "<b>{}</b> is currently making a reservation on <b>{}</b>! Try again in <b>{}</b> minute(s).".format(hold.team.fullname, hold.location, minutes_left)
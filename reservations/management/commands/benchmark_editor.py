@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from reservations.benchmarks import seed_league, run_benchmark, format_report
+
+# Load tests the reservation editor (see reservations.benchmarks)
+# Everything happens in a throwaway test database, so it is safe to run anywhere.
+class Command(BaseCommand):
+    help = "Seeds a league in a test database and replays the reservation editor with concurrent simulated teams."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=200, help="How many teams to seed.")
+        parser.add_argument('--fields', type=int, default=20, help="How many fields to seed.")
+        parser.add_argument('--weeks', type=int, default=26, help="How many weeks of reservations to seed.")
+        parser.add_argument('--users', type=int, default=10, help="How many simulated teams run at the same time.")
+        parser.add_argument('--rounds', type=int, default=5, help="How many reservations each simulated team tries to make.")
+        parser.add_argument('--days', type=int, default=3, help="How many days the simulated teams book within (fewer days means more contention).")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the random league and choices.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            league = seed_league(teams=options['teams'], fields=options['fields'], weeks=options['weeks'], seed=options['seed'])
+            report = run_benchmark(league, users=options['users'], rounds=options['rounds'], days=options['days'], seed=options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for line in format_report(report):
+            self.stdout.write(line)
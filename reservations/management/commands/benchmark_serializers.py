@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reservations.models import Reservation
+from reservations.api.serializers import ReservationSerializer, reservation_values, serialize_reservation_rows
+
+# Compares ReservationSerializer with the .values() fast path used by the reservation list API
+# Both serialize every active, approved reservation (as the unfiltered list does), query included.
+class Command(BaseCommand):
+    help = "Times ReservationSerializer against the fast path used by the reservation list API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="How many times to serialize the list with each (the best time is kept).")
+
+    def handle(self, *args, **options):
+        reservations = Reservation.objects.filter(active=True, approved=True)
+
+        def serializer():
+            return ReservationSerializer(reservations.select_related('timeslot', 'team', 'gametype', 'location'), many=True).data
+
+        def fast_path():
+            return serialize_reservation_rows(reservation_values(reservations))
+
+        self.stdout.write("Reservations: {}".format(reservations.count()))
+
+        results = {}
+        for name, serialize in (('ReservationSerializer', serializer), ('Fast path', fast_path)):
+            best = None
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    data = serialize()
+                    elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            results[name] = data
+            self.stdout.write("{}: {:.1f} ms, {} queries".format(name, best * 1000, len(queries)))
+
+        if [dict(row) for row in results['ReservationSerializer']] != results['Fast path']:
+            self.stderr.write("The outputs differ!")
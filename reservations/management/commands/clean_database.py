@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from reservations.cleanup import clean_database, CLEAN_CHUNK_SIZE
+
+# Archives old reservations and cleans out inactive rows
+# Meant to be run weekly (e.g. from cron), so no page view has to do it.
+class Command(BaseCommand):
+    help = "Archives last week's reservations and inactive tournaments, and removes unused inactive rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Clean even if the database was already cleaned this week.")
+        parser.add_argument('--chunk-size', type=int, default=CLEAN_CHUNK_SIZE, help="How many rows to archive per batch.")
+
+    def handle(self, *args, **options):
+        report = clean_database(force=options['force'], chunk_size=options['chunk_size'])
+
+        if report is None:
+            self.stdout.write("Nothing to clean (already cleaned this week, or another clean is running).")
+            return
+
+        for name, count in report.items():
+            self.stdout.write("{}: {}".format(name.capitalize(), count))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reservations.cleanup import compact_timeslots, prune_overlaps
+
+# Merges duplicate custom timeslots and prunes overlaps that no longer mean anything
+# clean_database does this weekly as well.
+class Command(BaseCommand):
+    help = "Merges duplicate timeslots into one and removes stale timeslot overlaps."
+
+    def handle(self, *args, **options):
+        merged = compact_timeslots()
+        with transaction.atomic():
+            pruned = prune_overlaps()
+
+        self.stdout.write("Merged {} duplicate timeslots and removed {} stale overlaps.".format(merged, pruned))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from reservations.snapshots import publish_schedule, get_snapshot_root
+
+# Publishes the public schedule snapshot whenever the schedule changes
+# Run it with --loop as a worker process (see docker-compose.yml), or from cron without it.
+class Command(BaseCommand):
+    help = "Publishes the public dashboard and this week's game sheet as static files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Publish even if the schedule has not changed.")
+        parser.add_argument('--loop', action='store_true', help="Keep running, and publish again as the schedule changes.")
+        parser.add_argument('--interval', type=float, default=10, help="How long (in seconds) to wait between checks.")
+
+    def handle(self, *args, **options):
+        force = options['force']
+        total = 0
+
+        try:
+            while True:
+                if publish_schedule(force=force):
+                    total += 1
+                    self.stdout.write("Published the schedule to {}.".format(get_snapshot_root()))
+                force = False
+
+                if not options['loop']:
+                    break
+
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        if not total:
+            self.stdout.write("The schedule is up to date.")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reservations.availability import rebuild_index
+from reservations.models import AvailabilityBlock
+
+# Rebuilds the availability index used by the reservation editor
+# Run this after loading reservations or tournaments from fixtures.
+class Command(BaseCommand):
+    help = "Rebuilds the availability index from the current reservations and tournaments."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_index()
+
+        self.stdout.write("Indexed {} availability blocks.".format(AvailabilityBlock.objects.count()))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from reservations.outbox import send_queued_emails, OUTBOX_BATCH_SIZE
+
+# Sends the queued emails
+# Run it with --loop as a worker process (see docker-compose.yml), or from cron without it.
+class Command(BaseCommand):
+    help = "Sends the queued outbound emails."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, and send emails as they are queued.")
+        parser.add_argument('--interval', type=float, default=5, help="How long (in seconds) to wait when the queue is empty.")
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE, help="How many emails to send over one connection at a time.")
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        total = 0
+
+        try:
+            while True:
+                count = send_queued_emails(batch_size=options['batch_size'], connection=connection)
+                total += count
+
+                if count:
+                    continue
+                if not options['loop']:
+                    break
+
+                # Don't hold the SMTP or database connections open while idle
+                connection.close()
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+        self.stdout.write("Handled {} emails.".format(total))
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.http import FileResponse
+from django.urls import reverse
+
+from reservations.utils import get_roles
+from reservations.snapshots import SNAPSHOT_FILES, get_snapshot_path, get_manifest, is_fresh
+
+# Loads the user's roles (groups) once per request
+# The is_* helpers and the auth_groups context processor all read them from the user.
+class RoleMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        get_roles(request.user)
+        return self.get_response(request)
+
+# Serves the published schedule snapshots (see reservations.snapshots)
+# Anonymous visitors without a session get the pre-rendered dashboard; anyone can get
+# this week's game sheet from SCHEDULE_SNAPSHOT_URL. Everything else (and anything
+# that was not published yet, or is out of date) falls through to the views.
+# It goes below XFrameOptionsMiddleware, so the snapshots get the same headers as the views.
+class ScheduleSnapshotMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = None
+        if request.method in ('GET', 'HEAD'):
+            response = self.get_snapshot(request)
+        return response or self.get_response(request)
+
+    def get_snapshot(self, request):
+        url = getattr(settings, 'SCHEDULE_SNAPSHOT_URL', '/schedule/')
+
+        if request.path == reverse('dashboard'):
+            # Sessions and messages can change what the dashboard looks like
+            if request.GET or settings.SESSION_COOKIE_NAME in request.COOKIES or 'messages' in request.COOKIES:
+                return None
+            name = 'index.html'
+        elif request.path.startswith(url) and request.path[len(url):] in SNAPSHOT_FILES:
+            name = request.path[len(url):]
+        else:
+            return None
+
+        # Not published since the schedule changed (or since yesterday)
+        if not is_fresh(get_manifest()):
+            return None
+
+        try:
+            snapshot = open(get_snapshot_path(name), 'rb')
+        except IOError:
+            return None
+
+        response = FileResponse(snapshot, content_type=SNAPSHOT_FILES[name])
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:06
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+def build_index(apps, schema_editor):
+    AvailabilityBlock = apps.get_model("reservations", "AvailabilityBlock")
+    Reservation = apps.get_model("reservations", "Reservation")
+    Tournament = apps.get_model("reservations", "Tournament")
+    TimeSlot = apps.get_model("reservations", "TimeSlot")
+    Overlap = TimeSlot._meta.get_field('overlap').remote_field.through
+
+    # Format: { timeslot1: [(timeslot1, field1), (overlap1, field1), ...], ... }
+    blocked = {}
+    for pk, location_id in TimeSlot.objects.values_list('pk', 'location_id'):
+        blocked[pk] = [(pk, location_id)]
+    for from_id, to_id, location_id in Overlap.objects.values_list('from_timeslot_id', 'to_timeslot_id', 'to_timeslot__location_id'):
+        blocked[from_id].append((to_id, location_id))
+
+    blocks = []
+    for reservation in Reservation.objects.filter(active=True).iterator():
+        for timeslot_id, location_id in blocked[reservation.timeslot_id]:
+            blocks.append(AvailabilityBlock(date=reservation.date, location_id=location_id, timeslot_id=timeslot_id, reservation_id=reservation.pk))
+
+    for tournament in Tournament.objects.filter(active=True).prefetch_related('locations'):
+        for offset in range((tournament.end_date - tournament.start_date).days + 1):
+            date = tournament.start_date + datetime.timedelta(days=offset)
+            for location in tournament.locations.all():
+                blocks.append(AvailabilityBlock(date=date, location_id=location.pk, tournament_id=tournament.pk))
+
+    AvailabilityBlock.objects.bulk_create(blocks, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0037_alter_archivedreservation_gender_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reservations.field')),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='reservations.reservation')),
+                ('timeslot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='reservations.timeslot')),
+                ('tournament', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='reservations.tournament')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'location'], name='availability_date_location')],
+            },
+        ),
+        migrations.RunPython(build_index, reverse_code=migrations.RunPython.noop),
+    ]
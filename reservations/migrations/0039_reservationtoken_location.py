@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Old tokens held a whole date (or everything), so they are dropped rather than converted
+def clear_tokens(apps, schema_editor):
+    ReservationToken = apps.get_model("reservations", "ReservationToken")
+    ReservationToken.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0038_availabilityblock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_tokens, reverse_code=migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='reservationtoken',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='reservations.field'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservationtoken',
+            constraint=models.UniqueConstraint(fields=('hold_date', 'location'), name='reservationtoken_hold'),
+        ),
+    ]
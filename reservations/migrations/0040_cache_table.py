@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:20
+
+from django.db import migrations
+from django.core.management import call_command
+
+# Creates the table for the database cache backend (does nothing for other backends)
+def create_cache_table(apps, schema_editor):
+    call_command('createcachetable', database=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0039_reservationtoken_location'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, reverse_code=migrations.RunPython.noop),
+    ]
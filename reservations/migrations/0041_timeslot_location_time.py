@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0040_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['location', 'start_time', 'end_time'], name='timeslot_location_time'),
+        ),
+    ]
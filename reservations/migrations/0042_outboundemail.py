@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0041_timeslot_location_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('subject', models.CharField(max_length=2048)),
+                ('template', models.CharField(max_length=2048)),
+                ('context', models.JSONField(default=dict)),
+                ('to_emails', models.JSONField(default=list)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('sent__isnull', True)), fields=['next_attempt'], name='outboundemail_due')],
+            },
+        ),
+    ]
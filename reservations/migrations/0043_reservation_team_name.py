@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+# Fills in the team names (same as User.fullname) of existing reservations
+def fill_team_names(apps, schema_editor):
+    Reservation = apps.get_model("reservations", "Reservation")
+    User = apps.get_model("auth", "User")
+
+    for pk, username, description in User.objects.filter(reservation__isnull=False).distinct().values_list('pk', 'username', 'profile__description'):
+        Reservation.objects.filter(team=pk).update(team_name=username + " (" + description + ")" if description else username)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0042_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='team_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=2048),
+        ),
+        migrations.RunPython(fill_team_names, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0043_reservation_team_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('active', True)), fields=['approved', 'date'], name='reservation_active_approved'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('active', True)), fields=['date', 'timeslot'], name='reservation_active_timeslot'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('active', True)), fields=['team', 'date'], name='reservation_active_team'),
+        ),
+        migrations.AddIndex(
+            model_name='tournament',
+            index=models.Index(condition=models.Q(('active', True)), fields=['end_date', 'start_date'], name='tournament_active_dates'),
+        ),
+    ]
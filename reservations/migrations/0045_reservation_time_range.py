@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:40
+
+import django.contrib.postgres.fields.ranges
+from django.db import migrations
+from django.db.backends.postgresql.psycopg_any import NumericRange
+
+# Fills in the time ranges of existing reservations (same as reservations.overlap.get_time_range)
+# The reservation_no_overlap constraint can't be added while active reservations overlap, so the
+# migration stops and lists them instead. Move or delete them, then run the migration again.
+def fill_time_ranges(apps, schema_editor):
+    Reservation = apps.get_model("reservations", "Reservation")
+    TimeSlot = apps.get_model("reservations", "TimeSlot")
+
+    def get_seconds(time):
+        return time.hour * 3600 + time.minute * 60 + time.second
+
+    ranges = {}
+    for pk, start_time, end_time in TimeSlot.objects.values_list('pk', 'start_time', 'end_time'):
+        ranges[pk] = (get_seconds(start_time), get_seconds(end_time) if end_time > start_time else 24 * 60 * 60)
+
+    for timeslot, (start, end) in ranges.items():
+        Reservation.objects.filter(timeslot=timeslot).update(time_range=NumericRange(start, end, '[)'))
+
+    # Format: { (field1, date1): [(start, end, reservation1), ...], ... }
+    kept = {}
+    conflicts = []
+    for pk, location, date, timeslot in Reservation.objects.filter(active=True).order_by('pk').values_list('pk', 'location', 'date', 'timeslot'):
+        start, end = ranges[timeslot]
+        others = kept.setdefault((location, date), [])
+        for other_start, other_end, other in others:
+            if other_start < end and other_end > start:
+                conflicts.append("{} (overlaps with {})".format(pk, other))
+                break
+        else:
+            others.append((start, end, pk))
+
+    if conflicts:
+        raise RuntimeError("These active reservations overlap with another reservation on the same field and date: {}. Move or delete them, then migrate again.".format(", ".join(conflicts)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0044_active_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='time_range',
+            field=django.contrib.postgres.fields.ranges.IntegerRangeField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_time_ranges, reverse_code=migrations.RunPython.noop),
+    ]
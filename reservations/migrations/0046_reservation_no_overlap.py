@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:48
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+import django.db.models.constraints
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0045_reservation_time_range'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='time_range',
+            field=django.contrib.postgres.fields.ranges.IntegerRangeField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('active', True)), deferrable=django.db.models.constraints.Deferrable['IMMEDIATE'], expressions=[(models.Func('location', 'location', django.contrib.postgres.fields.ranges.RangeBoundary(inclusive_upper=True), function='INT8RANGE', output_field=django.contrib.postgres.fields.ranges.BigIntegerRangeField()), '&&'), (models.Func('date', 'date', django.contrib.postgres.fields.ranges.RangeBoundary(inclusive_upper=True), function='DATERANGE', output_field=django.contrib.postgres.fields.ranges.DateRangeField()), '&&'), ('time_range', '&&')], name='reservation_no_overlap'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0046_reservation_no_overlap'),
+    ]
+
+    # 0037 recorded the gender defaults as bytes (b'boys'); the models use str.
+    # Only the migration state changes, Django doesn't keep field defaults in the database.
+    operations = [
+        migrations.AlterField(
+            model_name='archivedreservation',
+            name='gender',
+            field=models.CharField(choices=[('boys', 'Male'), ('girls', 'Female')], default='boys', max_length=5),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='gender',
+            field=models.CharField(choices=[('boys', 'Male'), ('girls', 'Female')], default='boys', max_length=5),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User, Group
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import IntegerRangeField, BigIntegerRangeField, DateRangeField, RangeBoundary, RangeOperators
 
 from natsort import natsorted
 
@@ -64,6 +67,10 @@ class TimeSlot(models.Model):
 
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            # Finds the existing timeslot for a custom (field, start, end)
+            models.Index(fields=['location', 'start_time', 'end_time'], name='timeslot_location_time')
+        ]
 
 # GameType Model
 class GameType(models.Model):
@@ -94,6 +101,10 @@ class Tournament(models.Model):
 
     class Meta:
         ordering = ['start_date']
+        indexes = [
+            # Active tournaments overlapping a date range
+            models.Index(fields=['end_date', 'start_date'], condition=models.Q(active=True), name='tournament_active_dates'),
+        ]
 
 class ArchivedTournament(models.Model):
     name = models.CharField(max_length=2048)
@@ -123,11 +134,44 @@ class Reservation(models.Model):
     age = models.CharField(max_length=10)
     gender = models.CharField(max_length=5, choices=GENDER_CHOICES, default='boys')
 
+    # A copy of team.fullname, so listing reservations never has to load teams' profiles
+    # Kept in step by reservations.signals.
+    team_name = models.CharField(max_length=2048, blank=True, default="", editable=False, db_index=True)
+
+    # The seconds of the day the timeslot covers, [start, end), so the database can keep
+    # reservations from overlapping (see reservations.overlap.get_time_range)
+    time_range = IntegerRangeField(editable=False)
+
     def __str__(self):
-        return "{} @ {}".format(self.team.fullname, self.location.name)
+        return "{} @ {}".format(self.team_name, self.location.name)
 
     class Meta:
         ordering = ['date', 'location__name', 'timeslot__start_time']
+        # Every listing only looks at active reservations, so the indexes leave the rest out
+        indexes = [
+            # Upcoming approved/pending reservations (dashboard, all_reservations, resvCount)
+            models.Index(fields=['approved', 'date'], condition=models.Q(active=True), name='reservation_active_approved'),
+            # Conflicts on a date (reservations.overlap.get_conflicts)
+            models.Index(fields=['date', 'timeslot'], condition=models.Q(active=True), name='reservation_active_timeslot'),
+            # A team's upcoming reservations (my_reservations, resvCount)
+            models.Index(fields=['team', 'date'], condition=models.Q(active=True), name='reservation_active_team'),
+        ]
+        constraints = [
+            # No two active reservations on a field overlap (reservations.overlap.save_reservation)
+            # The field and date are compared as single-value ranges, so GiST can index all three
+            # without the btree_gist extension. Deferrable, so that reservations can trade places
+            # within a transaction (SwapForm).
+            ExclusionConstraint(
+                name='reservation_no_overlap',
+                expressions=[
+                    (models.Func('location', 'location', RangeBoundary(inclusive_upper=True), function='INT8RANGE', output_field=BigIntegerRangeField()), RangeOperators.OVERLAPS),
+                    (models.Func('date', 'date', RangeBoundary(inclusive_upper=True), function='DATERANGE', output_field=DateRangeField()), RangeOperators.OVERLAPS),
+                    ('time_range', RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(active=True),
+                deferrable=models.Deferrable.IMMEDIATE,
+            ),
+        ]
 
 # Archived Reservation Model
 class ArchivedReservation(models.Model):
@@ -147,15 +191,65 @@ class ArchivedReservation(models.Model):
     def __str__(self):
         return "{} @ {}".format(self.team, self.location)
 
-# Reservation Token (used to prevent multiple reservations at one time)
+# Availability Index (used to look up open timeslots for a date without scanning reservations)
+# Each row blocks a timeslot on a date. A row without a timeslot closes the whole field (tournaments).
+class AvailabilityBlock(models.Model):
+    date = models.DateField()
+    location = models.ForeignKey(Field, on_delete=models.CASCADE)
+    timeslot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE, null=True, blank=True)
+
+    # What is blocking this timeslot/field
+    reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, null=True, blank=True)
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, null=True, blank=True)
+
+    def __str__(self):
+        if self.timeslot_id:
+            return "{} blocked on {}".format(self.timeslot, self.date.strftime('%m/%d/%Y'))
+        return "{} closed on {}".format(self.location, self.date.strftime('%m/%d/%Y'))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'location'], name='availability_date_location'),
+        ]
+
+# Reservation Token (a hold on a field for a date, so two teams don't book the same field at once)
 class ReservationToken(models.Model):
     team = models.ForeignKey(User, on_delete=models.CASCADE)
     issued = models.DateTimeField(auto_now_add=True)
     hold_date = models.DateField(blank=True, null=True)
+    location = models.ForeignKey(Field, on_delete=models.CASCADE, null=True, blank=True)
 
     def __str__(self):
         return "Issued to {} at {}".format(self.team, self.issued)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hold_date', 'location'], name='reservationtoken_hold'),
+        ]
+
+# Outbound Email (queued by send_email, and sent by the send_emails worker)
+class OutboundEmail(models.Model):
+    created = models.DateTimeField(auto_now_add=True)
+
+    subject = models.CharField(max_length=2048)
+    template = models.CharField(max_length=2048)
+    # Model instances are stored as references, and loaded when the email is rendered
+    context = models.JSONField(default=dict)
+    to_emails = models.JSONField(default=list)
+
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return "{} to {}".format(self.subject, ", ".join(self.to_emails))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt'], condition=models.Q(sent__isnull=True), name='outboundemail_due'),
+        ]
+
 # Website Settings
 class WebsiteSetting(models.Model):
     key = models.CharField(max_length=2048, unique=True)
@@ -195,5 +289,8 @@ def change_group(self, group):
     group = Group.objects.get(name=group)
     self.groups.clear()
     self.groups.add(group)
+
+    # Forget the roles loaded for this user (see reservations.utils.get_roles)
+    self.__dict__.pop('_roles', None)
 User.add_to_class("fullname", fullname)
 User.add_to_class("change_group", change_group)
@@ -0,0 +1,131 @@
+# Email Outbox
+# Emails are queued as OutboundEmail rows in the same transaction as the change they
+# are about, so they are only ever sent once that change commits. The send_emails
+# worker renders them and sends them in batches over one SMTP connection, retrying
+# failures with an exponential backoff.
+import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import get_connection, EmailMessage
+from django.db import models, transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from reservations.models import OutboundEmail
+
+# How many emails are claimed (and sent over one connection) at a time
+OUTBOX_BATCH_SIZE = 50
+
+# Gives up on an email after this many failed attempts
+OUTBOX_MAX_ATTEMPTS = 8
+
+# The longest wait (in seconds) between attempts
+OUTBOX_MAX_BACKOFF = 60 * 60 * 6
+
+# How long (in seconds) a worker has to send the emails it claimed before they are due again
+OUTBOX_CLAIM_TIMEOUT = 60 * 10
+
+""" Context Serialization """
+# Replaces model instances in a template context with references to them
+def serialize_context(context):
+    serialized = {}
+    for key, value in context.items():
+        if isinstance(value, models.Model):
+            serialized[key] = { '__model__': value._meta.label, 'pk': value.pk }
+        else:
+            serialized[key] = value
+    return serialized
+
+# Loads the model instances referenced in a serialized context
+# Pass in a dictionary to share loaded instances between contexts.
+def deserialize_context(serialized, loaded=None):
+    loaded = {} if loaded is None else loaded
+
+    context = {}
+    for key, value in serialized.items():
+        if isinstance(value, dict) and '__model__' in value:
+            reference = (value['__model__'], value['pk'])
+            if reference not in loaded:
+                model = apps.get_model(value['__model__'])
+                loaded[reference] = model._default_manager.filter(pk=value['pk']).first()
+            value = loaded[reference]
+        context[key] = value
+    return context
+
+""" Queue """
+# Queues a batch of emails
+# Format: [(title, template, context, to_emails), ...]
+def queue_emails(emails):
+    outbound = []
+    for title, template, context, to_emails in emails:
+        to_emails = [email for email in to_emails if email]
+        if not to_emails:
+            continue
+
+        outbound.append(OutboundEmail(subject=settings.EMAIL_SUBJECT_PREFIX + title, template=template, context=serialize_context(context), to_emails=to_emails))
+
+    OutboundEmail.objects.bulk_create(outbound)
+
+""" Worker """
+# Gets when a failed email should be tried again
+def get_next_attempt(attempts):
+    return timezone.now() + datetime.timedelta(seconds=min(30 * 2 ** attempts, OUTBOX_MAX_BACKOFF))
+
+# Claims a batch of due emails by pushing their next attempt past the claim timeout
+# The rows are only locked while they are claimed, so several workers can run side by side
+# without holding locks over SMTP. Emails claimed by a worker that dies are sent again later.
+def claim_emails(batch_size):
+    with transaction.atomic():
+        emails = list(OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+            sent__isnull=True, next_attempt__lte=timezone.now(), attempts__lt=OUTBOX_MAX_ATTEMPTS
+        ).order_by('next_attempt')[:batch_size])
+
+        if emails:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(next_attempt=timezone.now() + datetime.timedelta(seconds=OUTBOX_CLAIM_TIMEOUT))
+    return emails
+
+# Sends a batch of due emails
+# Pass in an open connection to reuse it between batches.
+# Returns how many emails were handled (sent or failed)
+def send_queued_emails(batch_size=OUTBOX_BATCH_SIZE, connection=None):
+    emails = claim_emails(batch_size)
+    if not emails:
+        return 0
+
+    own_connection = connection is None
+    connection = connection or get_connection()
+
+    # A batch usually fans out a few templates (and objects) to many recipients
+    templates = {}
+    loaded = {}
+
+    for email in emails:
+        try:
+            if email.template not in templates:
+                templates[email.template] = get_template(email.template)
+            body = templates[email.template].render(deserialize_context(email.context, loaded))
+
+            # Opens the connection if it is not open already, and keeps it open for the rest of the batch
+            connection.open()
+            connection.send_messages([EmailMessage(email.subject, body, settings.SERVER_EMAIL, email.to_emails)])
+        except Exception as error:
+            email.attempts += 1
+            email.next_attempt = get_next_attempt(email.attempts)
+            email.error = str(error)
+
+            # Start the next email on a fresh connection
+            connection.close()
+        else:
+            email.attempts += 1
+            email.sent = timezone.now()
+            email.error = ""
+            # The context is only needed to render the email
+            email.context = {}
+
+    if own_connection:
+        connection.close()
+
+    OutboundEmail.objects.bulk_update(emails, ['attempts', 'next_attempt', 'sent', 'error', 'context'])
+
+    return len(emails)
@@ -0,0 +1,180 @@
+# Overlap Engine
+# Answers "which timeslots overlap with this one" from an in-memory interval tree per field.
+# Each tree is built lazily from one query and kept in this process until the field's
+# version stamp changes (any timeslot on the field is saved or deleted).
+# The TimeSlot.overlap table is kept in step with it by the TimeSlot signals.
+# The database has the final say: the reservation_no_overlap constraint keeps active
+# reservations on a field from overlapping, however many teams book at once.
+import datetime
+from contextlib import contextmanager
+
+from django.db import transaction, IntegrityError
+from django.db.backends.postgresql.psycopg_any import NumericRange
+
+from reservations.models import Reservation, TimeSlot
+from reservations.utils import get_cache_version, bump_cache_version
+
+# Format: { field1: (version, tree), ... }
+_trees = {}
+
+
+""" Interval Tree """
+# An implicit, augmented interval tree
+# The intervals are sorted by start, the midpoint of every range is its root,
+# and max_ends holds the latest end in the range rooted at each index.
+class IntervalTree(object):
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals)
+        self.max_ends = [None] * len(self.intervals)
+        self.build(0, len(self.intervals))
+
+    def build(self, low, high):
+        if low >= high:
+            return None
+
+        mid = (low + high) // 2
+        max_end = self.intervals[mid][1]
+        for child in (self.build(low, mid), self.build(mid + 1, high)):
+            if child is not None and child > max_end:
+                max_end = child
+
+        self.max_ends[mid] = max_end
+        return max_end
+
+    # Gets the values of every interval overlapping [start, end)
+    # Runs in O(log n + k)
+    def query(self, start, end):
+        found = []
+        ranges = [(0, len(self.intervals))]
+
+        while ranges:
+            low, high = ranges.pop()
+            if low >= high:
+                continue
+
+            mid = (low + high) // 2
+
+            # Nothing in this range ends after the start
+            if self.max_ends[mid] <= start:
+                continue
+
+            ranges.append((low, mid))
+
+            interval_start, interval_end, value = self.intervals[mid]
+            if interval_start < end:
+                if interval_end > start:
+                    found.append(value)
+
+                # Everything to the right starts later, so only look there if this one started in time
+                ranges.append((mid + 1, high))
+
+        return found
+
+""" Times """
+# A timeslot that ends at (or before) its start runs until midnight
+def get_end_time(start_time, end_time):
+    return end_time if end_time > start_time else datetime.time.max
+
+def get_seconds(time):
+    return time.hour * 3600 + time.minute * 60 + time.second
+
+# Gets the seconds of the day a timeslot covers, as stored in Reservation.time_range
+def get_time_range(timeslot):
+    start = get_seconds(timeslot.start_time)
+    end = get_seconds(timeslot.end_time) if timeslot.end_time > timeslot.start_time else 24 * 60 * 60
+    return NumericRange(start, end, '[)')
+
+""" Tree Cache """
+def get_version_name(location_id):
+    return 'timeslots:{}'.format(location_id)
+
+# Gets the fields with timeslot changes in the current transaction
+# Their trees are rebuilt on every lookup (and not kept) until it commits or rolls back.
+# The set is kept on the connection and started over outside of a transaction, so a rollback can't leave a field pending.
+def get_pending():
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block or not hasattr(connection, 'pending_trees'):
+        connection.pending_trees = set()
+    return connection.pending_trees
+
+# Gets the interval tree of every timeslot (active or not) on a field
+def get_tree(location_id):
+    version = get_cache_version(get_version_name(location_id))
+    pending = location_id in get_pending()
+
+    cached = _trees.get(location_id)
+    if cached and cached[0] == version and not pending:
+        return cached[1]
+
+    tree = IntervalTree((start, get_end_time(start, end), pk) for start, end, pk in TimeSlot.objects.filter(location=location_id).values_list('start_time', 'end_time', 'pk'))
+    if not pending:
+        _trees[location_id] = (version, tree)
+
+    return tree
+
+# Throws away a field's tree here, and in every other process once the transaction commits
+def expire_tree(location_id):
+    _trees.pop(location_id, None)
+
+    pending = get_pending()
+    pending.add(location_id)
+    transaction.on_commit(lambda: pending.discard(location_id))
+
+    bump_cache_version(get_version_name(location_id))
+
+""" Lookups """
+# Gets the ids of the timeslots that overlap with this timeslot (not including itself)
+def get_overlapping(timeslot):
+    return set(get_tree(timeslot.location_id).query(timeslot.start_time, get_end_time(timeslot.start_time, timeslot.end_time))) - set([timeslot.pk])
+
+# Gets the active reservations on a date that conflict with this timeslot,
+# either by being on it or on a timeslot that overlaps with it
+def get_conflicts(date, timeslot, exclude=()):
+    timeslots = get_overlapping(timeslot) | set([timeslot.pk])
+    return Reservation.objects.filter(active=True, date=date, timeslot__in=timeslots).exclude(pk__in=exclude)
+
+# Makes the stored overlaps of this timeslot match the tree
+# Every overlapping timeslot is linked, active or not: an unused custom timeslot can be reused and booked
+# later, and the availability index only blocks what the links point to.
+def sync_overlaps(timeslot):
+    timeslot.overlap.set(get_overlapping(timeslot))
+
+""" Constraint """
+# The exclusion constraint on Reservation (see Reservation.Meta)
+OVERLAP_CONSTRAINT = 'reservation_no_overlap'
+
+# Returns whether an IntegrityError came from the overlap constraint
+def is_conflict(error):
+    return OVERLAP_CONSTRAINT in str(error)
+
+def set_overlap_check(mode):
+    with transaction.get_connection().cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS {} {}".format(OVERLAP_CONSTRAINT, mode))
+
+# Only checks the overlap constraint once the block is done, so reservations can trade places in it
+# Raises an IntegrityError (see is_conflict) at the end if they still overlap; the block is rolled back.
+@contextmanager
+def deferred_overlap_check():
+    try:
+        with transaction.atomic():
+            set_overlap_check('DEFERRED')
+            yield
+            set_overlap_check('IMMEDIATE')
+    except BaseException:
+        # Don't leave the constraint deferred for the rest of an outer transaction
+        connection = transaction.get_connection()
+        if connection.in_atomic_block and not connection.needs_rollback:
+            set_overlap_check('IMMEDIATE')
+        raise
+
+# Saves a reservation, unless it would overlap with another active reservation on its field
+# Returns whether it was saved
+def save_reservation(reservation):
+    try:
+        with transaction.atomic():
+            reservation.save()
+    except IntegrityError as error:
+        if not is_conflict(error):
+            raise
+        return False
+    return True
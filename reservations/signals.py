@@ -0,0 +1,226 @@
+# Signal receivers (connected in ReservationsConfig.ready)
+from django.core.signals import request_started
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from django.contrib.auth.models import User, Group
+
+from reservations.models import Reservation, Tournament, TimeSlot, WebsiteSetting, TeamProfile, Field, GameType
+from reservations.availability import index_reservations, index_tournament, index_timeslots
+from reservations.overlap import expire_tree, sync_overlaps, get_time_range
+from reservations.utils import bump_cache_version, expire_versioned_values, bump_website_settings, bump_superusers
+from reservations.access import bump_field_access
+
+""" Availability Index """
+@receiver(post_save, sender=Reservation)
+def index_reservation_on_save(sender, instance, raw=False, **kwargs):
+    # Fixtures are loaded raw; run the rebuild_availability command after loading them.
+    if raw:
+        return
+    index_reservations([instance])
+
+@receiver(post_save, sender=Tournament)
+def index_tournament_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_tournament(instance)
+
+@receiver(m2m_changed, sender=Tournament.locations.through)
+def index_tournament_on_locations(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    # Reverse means the field's tournaments were changed (field.tournament_set)
+    if reverse:
+        tournaments = Tournament.objects.filter(pk__in=pk_set) if pk_set else instance.tournament_set.all()
+        for tournament in tournaments:
+            index_tournament(tournament)
+    else:
+        index_tournament(instance)
+
+@receiver(post_save, sender=TimeSlot)
+def index_timeslot_on_save(sender, instance, created=False, raw=False, **kwargs):
+    # A new timeslot has no reservations to re-index
+    if raw or created:
+        return
+    index_timeslots([instance.pk])
+
+@receiver(m2m_changed, sender=TimeSlot.overlap.through)
+def index_timeslot_on_overlap(sender, instance, action, pk_set, **kwargs):
+    # Remember who the timeslot overlapped with before the overlaps are cleared
+    if action == 'pre_clear':
+        instance._cleared_overlap = list(instance.overlap.values_list('pk', flat=True))
+        return
+
+    if action in ('post_add', 'post_remove'):
+        index_timeslots([instance.pk] + list(pk_set or []))
+    elif action == 'post_clear':
+        index_timeslots([instance.pk] + getattr(instance, '_cleared_overlap', []))
+
+""" Overlap Engine """
+# Remember which field the timeslot was on, in case it's being moved
+@receiver(pre_save, sender=TimeSlot)
+def remember_timeslot_location(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._previous_location_id = TimeSlot.objects.filter(pk=instance.pk).values_list('location_id', flat=True).first()
+
+@receiver(post_save, sender=TimeSlot)
+def sync_timeslot_overlaps(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_location_id', None)
+    if previous is not None and previous != instance.location_id:
+        expire_tree(previous)
+    expire_tree(instance.location_id)
+    sync_overlaps(instance)
+
+@receiver(post_delete, sender=TimeSlot)
+def expire_timeslot_tree(sender, instance, **kwargs):
+    expire_tree(instance.location_id)
+
+# Keeps Reservation.time_range in step with the timeslot's times
+@receiver(pre_save, sender=Reservation)
+def set_time_range(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance.time_range = get_time_range(instance.timeslot)
+
+@receiver(post_save, sender=TimeSlot)
+def sync_time_range(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    time_range = get_time_range(instance)
+    Reservation.objects.filter(timeslot=instance).exclude(time_range=time_range).update(time_range=time_range)
+
+""" Versioned Values """
+@receiver(request_started)
+def check_versioned_values(sender, **kwargs):
+    expire_versioned_values()
+
+@receiver(post_save, sender=WebsiteSetting)
+@receiver(post_delete, sender=WebsiteSetting)
+def expire_website_settings_on_change(sender, raw=False, **kwargs):
+    # Fixtures are loaded raw, possibly by migrations before the cache table exists.
+    if raw:
+        return
+    bump_website_settings()
+
+@receiver(post_save, sender=User)
+def expire_superusers_on_save(sender, raw=False, update_fields=None, **kwargs):
+    # Logging in only saves last_login
+    if raw or (update_fields and set(update_fields) == set(['last_login'])):
+        return
+    bump_superusers()
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(m2m_changed, sender=User.groups.through)
+def expire_superusers_on_change(sender, raw=False, action=None, **kwargs):
+    if raw or (action and not action.startswith('post_')):
+        return
+    bump_superusers()
+
+""" Field Access """
+# The access matrix changes with the Field.teams memberships, a field's active flag, and deleted teams
+@receiver(m2m_changed, sender=Field.teams.through)
+@receiver(post_save, sender=Field)
+@receiver(post_delete, sender=Field)
+@receiver(post_delete, sender=User)
+def expire_field_access(sender, raw=False, action=None, **kwargs):
+    if raw or (action and not action.startswith('post_')):
+        return
+    bump_field_access()
+
+""" Schedule Version """
+# Bumped whenever the schedule (reservations, approvals, tournaments and gametypes) changes
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_save, sender=Tournament)
+@receiver(post_delete, sender=Tournament)
+@receiver(m2m_changed, sender=Tournament.locations.through)
+@receiver(post_save, sender=GameType)
+@receiver(post_delete, sender=GameType)
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+@receiver(post_delete, sender=TeamProfile)
+def bump_schedule_version(sender, raw=False, action=None, **kwargs):
+    if raw or (action and not action.startswith('post_')):
+        return
+    bump_cache_version('schedule')
+
+""" Gametype Version """
+# Bumped whenever a gametype changes (the dashboard's gametype blocks are cached by it)
+@receiver(post_save, sender=GameType)
+@receiver(post_delete, sender=GameType)
+def bump_gametypes_version(sender, raw=False, **kwargs):
+    if raw:
+        return
+    bump_cache_version('gametypes')
+
+""" API Versions """
+# Bumped whenever what the reservation/tournament APIs return changes (see reservations.api.views)
+# Timeslot times and team names are copied onto reservations with .update(), which sends no signals.
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_save, sender=TeamProfile)
+@receiver(post_delete, sender=TeamProfile)
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def bump_reservations_version(sender, raw=False, **kwargs):
+    if raw:
+        return
+    bump_cache_version('reservations')
+
+@receiver(post_save, sender=User)
+def bump_reservations_version_on_team(sender, raw=False, update_fields=None, **kwargs):
+    # Logging in only saves last_login
+    if raw or (update_fields and set(update_fields) == set(['last_login'])):
+        return
+    bump_cache_version('reservations')
+
+@receiver(post_save, sender=Tournament)
+@receiver(post_delete, sender=Tournament)
+@receiver(m2m_changed, sender=Tournament.locations.through)
+def bump_tournaments_version(sender, raw=False, action=None, **kwargs):
+    if raw or (action and not action.startswith('post_')):
+        return
+    bump_cache_version('tournaments')
+
+# Field and gametype names show up in both
+@receiver(post_save, sender=Field)
+@receiver(post_save, sender=GameType)
+def bump_api_versions(sender, raw=False, **kwargs):
+    if raw:
+        return
+    bump_cache_version('reservations')
+    bump_cache_version('tournaments')
+
+""" Team Names """
+# Keeps Reservation.team_name in step with User.fullname
+@receiver(pre_save, sender=Reservation)
+def set_team_name(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance.team_name = instance.team.fullname
+
+def sync_team_name(team, name):
+    Reservation.objects.filter(team=team).exclude(team_name=name).update(team_name=name)
+
+@receiver(post_save, sender=User)
+def sync_team_name_on_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logging in only saves last_login
+    if raw or (update_fields and set(update_fields) == set(['last_login'])):
+        return
+    sync_team_name(instance, instance.fullname)
+
+@receiver(post_save, sender=TeamProfile)
+def sync_team_name_on_profile(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync_team_name(instance.team, instance.team.fullname)
+
+@receiver(post_delete, sender=TeamProfile)
+def sync_team_name_on_profile_delete(sender, instance, **kwargs):
+    # The team may still hold on to the deleted profile, so its fullname would be out of date
+    sync_team_name(instance.team_id, User.objects.filter(pk=instance.team_id).values_list('username', flat=True).first() or "")
@@ -0,0 +1,127 @@
+# Public Schedule Snapshots
+# The public dashboard looks the same to every anonymous visitor, so it is rendered once
+# into SCHEDULE_SNAPSHOT_ROOT (with this week's game sheet as CSV and JSON) whenever the
+# schedule changes. ScheduleSnapshotMiddleware serves the files without touching the
+# session, the ORM or the templates. Run the publish_schedule command with --loop next to
+# the web workers (see docker-compose.yml) to keep them up to date.
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.base import SessionBase
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from reservations.utils import date_bounds, get_website_setting, get_cache_version
+
+# The version stamps the snapshots are rendered from
+SNAPSHOT_VERSIONS = ('schedule', 'reservations', 'tournaments', 'website_settings')
+
+# The files of a snapshot, and the content types they are served with
+SNAPSHOT_FILES = {
+    'index.html': 'text/html; charset=utf-8',
+    'games.csv': 'text/csv',
+    'games.json': 'application/json'
+}
+
+MANIFEST = 'snapshot.json'
+
+def get_snapshot_root():
+    return str(getattr(settings, 'SCHEDULE_SNAPSHOT_ROOT', os.path.join(settings.BASE_DIR, 'snapshots')))
+
+def get_snapshot_path(name):
+    return os.path.join(get_snapshot_root(), name)
+
+def get_snapshot_version():
+    return [get_cache_version(name) for name in SNAPSHOT_VERSIONS]
+
+# Returns whether a snapshot was published from the current schedule, today
+# The dashboard shows today's date, so a snapshot from yesterday is stale as well.
+def is_fresh(manifest):
+    return bool(manifest) and manifest.get('version') == get_snapshot_version() and manifest.get('date') == timezone.localdate().isoformat()
+
+# Gets the manifest of the published snapshot, or None
+def get_manifest():
+    try:
+        with open(get_snapshot_path(MANIFEST)) as manifest:
+            return json.load(manifest)
+    except (IOError, ValueError):
+        return None
+
+# Writes a file so that readers only ever see the old or the new one
+def write_file(name, content):
+    root = get_snapshot_root()
+    descriptor, temp_path = tempfile.mkstemp(dir=root, prefix='.' + name)
+    try:
+        with os.fdopen(descriptor, 'wb') as temp:
+            temp.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(root, name))
+    except:
+        os.unlink(temp_path)
+        raise
+
+""" Renderers """
+# Renders the dashboard as an anonymous visitor without a session sees it
+def render_dashboard():
+    # Imported here, since the views import most of the app
+    from reservations.views.general.dashboard import dashboard
+
+    request = RequestFactory().get(reverse('dashboard'), secure=True)
+    request.user = AnonymousUser()
+    request.session = SessionBase()
+
+    return dashboard(request).content
+
+# The same week (and rows) as the dashboard's Download button
+def get_sheet_bounds():
+    return date_bounds(start_bound=int(get_website_setting('CALENDAR_RANGE_START', 0)), end_bound=int(get_website_setting('CALENDAR_RANGE_END', 6)))
+
+def render_games_csv(bounds):
+    from reservations.views.general.dashboard import get_csv_rows
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for row in get_csv_rows(bounds):
+        writer.writerow(row)
+    return output.getvalue().encode('utf-8')
+
+def render_games_json(bounds):
+    from reservations.views.general.dashboard import get_reservation_events, get_tournament_events
+
+    # The calendar's windows are exclusive
+    end = bounds['end'] + datetime.timedelta(days=1)
+    return json.dumps({
+        'start': bounds['start'].isoformat(),
+        'end': bounds['end'].isoformat(),
+        'reservations': get_reservation_events(bounds['start'], end),
+        'tournaments': get_tournament_events(bounds['start'], end)
+    }).encode('utf-8')
+
+""" Publisher """
+# Publishes the snapshot if the schedule changed since the last one (or if forced)
+# Returns whether it was published
+def publish_schedule(force=False):
+    version = get_snapshot_version()
+    bounds = get_sheet_bounds()
+
+    manifest = get_manifest()
+    if not force and is_fresh(manifest) and manifest.get('week') == bounds['start'].isoformat():
+        return False
+
+    os.makedirs(get_snapshot_root(), exist_ok=True)
+
+    write_file('index.html', render_dashboard())
+    write_file('games.csv', render_games_csv(bounds))
+    write_file('games.json', render_games_json(bounds))
+
+    # Written last, so a snapshot is only marked up to date once all of it is
+    write_file(MANIFEST, json.dumps({ 'version': version, 'date': timezone.localdate().isoformat(), 'week': bounds['start'].isoformat(), 'published': timezone.now().isoformat() }).encode('utf-8'))
+
+    return True
@@ -0,0 +1,13 @@
+from django import template
+from django.contrib.auth.tokens import default_token_generator
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+register = template.Library()
+
+# The link a user follows to choose their own password
+# The token is made when the email is rendered, so it is never stored with a queued email.
+@register.simple_tag(name='passwordSetLink')
+def password_set_link(user):
+    return reverse('password_reset_confirm', kwargs={ 'uidb64': urlsafe_base64_encode(force_bytes(user.pk)), 'token': default_token_generator.make_token(user) })
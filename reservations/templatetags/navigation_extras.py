@@ -1,10 +1,14 @@
 from django import template
 from django.utils import timezone
 from django.conf import settings
+from django.core.cache import cache
 import re
 
 from reservations.models import Reservation
-from reservations.utils import is_superuser
+from reservations.utils import is_superuser, get_cache_version
+
+# How long (in seconds) the reservation counts are cached
+RESV_COUNT_TIMEOUT = 60 * 60
 
 register = template.Library()
 
@@ -12,14 +16,27 @@ register = template.Library()
 def firstLetter(username):
     return username.upper()[0]
 
+# Superusers see the number of pending reservations, and everyone else their upcoming ones
+# The counts are cached per role (and team), and versioned by the reservations, so any
+# reservation being made, edited, deleted or approved shows up right away.
 @register.simple_tag(name='resvCount', takes_context=True)
 def resv_count(context):
     request = context['request']
     if request.user.is_authenticated:
+        today = timezone.localtime(timezone.now()).date()
+
         if is_superuser(request.user):
-            count = Reservation.objects.filter(active=True, date__gte=timezone.localtime(timezone.now()).date(), approved=False).count()
+            key = 'resv_count:pending'
+            reservations = Reservation.objects.filter(active=True, date__gte=today, approved=False)
         else:
-            count = Reservation.objects.filter(active=True, date__gte=timezone.localtime(timezone.now()).date(), team=request.user).count()
+            key = 'resv_count:team:{}'.format(request.user.pk)
+            reservations = Reservation.objects.filter(active=True, date__gte=today, team=request.user)
+        key = '{}:{}:{}'.format(key, today.isoformat(), get_cache_version('reservations'))
+
+        count = cache.get(key)
+        if count is None:
+            count = reservations.count()
+            cache.set(key, count, RESV_COUNT_TIMEOUT)
         return str(count)
     return 0
 
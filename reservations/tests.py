@@ -1,10 +1,32 @@
-from django.test import TestCase
+import os
+import re
+import tempfile
+
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.core import mail
+from django.urls import reverse
+from django.utils import timezone
 from datetime import datetime, timedelta
 
 from reservations.forms import *
 from reservations.models import *
-from reservations.utils import get_object_or_none
+from reservations.utils import get_object_or_none, get_website_setting, set_website_setting, expire_website_settings, get_superuser_emails, is_manager, in_group
+from reservations.availability import get_blocked
+from reservations.holds import acquire_hold, get_held_fields
+from reservations.views.general.dashboard import get_csv_rows
+from reservations.cleanup import clean_database, clean_timeslots, clean_gametypes, clean_teams, compact_timeslots, prune_overlaps
+from reservations.overlap import IntervalTree, get_overlapping, get_conflicts, get_time_range, save_reservation
+from reservations.outbox import send_queued_emails
+from reservations.api.serializers import ReservationSerializer, reservation_values, serialize_reservation_rows
+from reservations.utils import send_email, date_bounds, get_cache_version, bump_cache_version
+from reservations.templatetags.navigation_extras import resv_count
+from reservations.benchmarks import seed_league, run_benchmark, format_report
+from reservations.snapshots import publish_schedule
+from reservations.access import get_matrix, get_team_fields, set_team_fields, set_field_teams
 from django.contrib.auth.models import User
+from django.contrib.admin.models import LogEntry
 
 class EmptyObject(object):
     pass
@@ -134,6 +156,14 @@ class ReservationTest(TestCase):
         self.assertTrue(timeslot.end_time == datetime.strptime("16:00", '%H:%M').time())
         self.assertTrue(timeslot.active == False)
 
+        # Reusing it brings its overlaps up to date
+        overlaps = set(timeslot.overlap.values_list('pk', flat=True))
+        self.assertEqual(overlaps, set([self.timeslot2.pk]))
+        timeslot.overlap.clear()
+        form.populate_session(request)
+        self.assertEqual(request.session['resv_timeslot'], timeslot.pk)
+        self.assertEqual(set(timeslot.overlap.values_list('pk', flat=True)), overlaps)
+
         data = {
             'game_number': 1,
             'game_opponent': "Game Opponent",
@@ -144,3 +174,839 @@ class ReservationTest(TestCase):
             'timeslot': timeslot
         }
         custom_reservation = Reservation(**data)
+
+class AvailabilityIndexTest(TestCase):
+    def setUp(self):
+        self.team = User.objects.create_user("test", 'jello@example.com', 'password')
+        self.team.change_group("Team")
+
+        self.field = Field(name="field")
+        self.field.save()
+
+        self.gametype = GameType(type="type")
+        self.gametype.save()
+
+        self.timeslot1 = TimeSlot(start_time=datetime.strptime("10:30", '%H:%M').time(), end_time=datetime.strptime("12:30", '%H:%M').time(), location=self.field)
+        self.timeslot1.save()
+
+        self.timeslot2 = TimeSlot(start_time=datetime.strptime("13:00", '%H:%M').time(), end_time=datetime.strptime("15:00", '%H:%M').time(), location=self.field)
+        self.timeslot2.save()
+
+        self.date = datetime.strptime("01/01/2016", "%m/%d/%Y").date()
+
+    def test_reservation_blocks(self):
+        reservation = Reservation(game_number=1, game_opponent="Game Opponent", gametype=self.gametype, date=self.date, team=self.team, location=self.field, timeslot=self.timeslot1)
+        reservation.save()
+        self.assertEqual(get_blocked(self.date), (set([self.timeslot1.pk]), set()))
+
+        # Deleting (deactivating) the reservation frees the timeslot
+        reservation.active = False
+        reservation.save()
+        self.assertEqual(get_blocked(self.date), (set(), set()))
+
+    def test_overlap_blocks(self):
+        custom = TimeSlot(active=False, start_time=datetime.strptime("12:00", '%H:%M').time(), end_time=datetime.strptime("14:00", '%H:%M').time(), location=self.field)
+        custom.save()
+
+        reservation = Reservation(game_number=1, game_opponent="Game Opponent", gametype=self.gametype, date=self.date, team=self.team, location=self.field, timeslot=custom)
+        reservation.save()
+        self.assertEqual(get_blocked(self.date), (set([custom.pk, self.timeslot1.pk, self.timeslot2.pk]), set()))
+
+        # Timeslots added afterwards are overlapped and re-index the reservation
+        timeslot3 = TimeSlot(start_time=datetime.strptime("13:30", '%H:%M').time(), end_time=datetime.strptime("16:00", '%H:%M').time(), location=self.field)
+        timeslot3.save()
+        self.assertEqual(get_blocked(self.date), (set([custom.pk, self.timeslot1.pk, self.timeslot2.pk, timeslot3.pk]), set()))
+
+    def test_tournament_closes_field(self):
+        tournament = Tournament(name="Tournament", start_date=self.date, end_date=self.date + timedelta(days=1))
+        tournament.save()
+        tournament.locations.add(self.field)
+
+        self.assertEqual(get_blocked(self.date), (set(), set([self.field.pk])))
+        self.assertEqual(get_blocked(self.date + timedelta(days=1)), (set(), set([self.field.pk])))
+        self.assertEqual(get_blocked(self.date + timedelta(days=2)), (set(), set()))
+
+        tournament.active = False
+        tournament.save()
+        self.assertEqual(get_blocked(self.date), (set(), set()))
+
+class ReservationHoldTest(TestCase):
+    def setUp(self):
+        self.team = User.objects.create_user("test", 'jello@example.com', 'password')
+        self.other_team = User.objects.create_user("test2", 'jello@example.com', 'password')
+
+        self.field = Field(name="field")
+        self.field.save()
+
+        self.other_field = Field(name="field2")
+        self.other_field.save()
+
+        self.date = datetime.strptime("01/01/2016", "%m/%d/%Y").date()
+
+    def test_holds(self):
+        # Two teams can hold different fields on the same date
+        self.assertTrue(acquire_hold(self.team, self.date, self.field.pk)[0])
+        self.assertTrue(acquire_hold(self.other_team, self.date, self.other_field.pk)[0])
+        self.assertEqual(get_held_fields(self.date, self.team), set([self.other_field.pk]))
+
+        # But not the same field
+        acquired, hold = acquire_hold(self.other_team, self.date, self.field.pk)
+        self.assertFalse(acquired)
+        self.assertEqual(hold.team, self.team)
+
+        # Expired holds are handed over
+        ReservationToken.objects.filter(team=self.team).update(issued=timezone.now() - timedelta(hours=1))
+        acquired, hold = acquire_hold(self.other_team, self.date, self.field.pk)
+        self.assertTrue(acquired)
+        self.assertEqual(hold.team, self.other_team)
+
+        # A team only keeps its latest hold
+        self.assertEqual(ReservationToken.objects.filter(team=self.other_team).count(), 1)
+
+class WebsiteSettingCacheTest(TestCase):
+    def test_settings_cache(self):
+        # The first lookup loads every setting, the rest come from memory
+        expire_website_settings(reload=True)
+        self.assertEqual(get_website_setting('CALENDAR_RANGE_START'), '0')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_website_setting('CALENDAR_RANGE_END'), '6')
+            self.assertEqual(get_website_setting('MISSING', 'default'), 'default')
+
+        # A new request only checks the version stamp
+        expire_website_settings()
+        with self.assertNumQueries(1):
+            get_website_setting('CALENDAR_RANGE_START')
+
+        # Saving a setting reloads the cache once the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            set_website_setting('CALENDAR_RANGE_START', 3)
+        self.assertEqual(get_website_setting('CALENDAR_RANGE_START'), '3')
+
+class CacheVersionTest(TestCase):
+    def test_bump_after_rollback(self):
+        version = get_cache_version('test')
+
+        # A bump in a rolled back savepoint doesn't swallow the next one
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    bump_cache_version('test')
+                    raise ValueError()
+            except ValueError:
+                pass
+            bump_cache_version('test')
+            bump_cache_version('test')
+        self.assertNotEqual(get_cache_version('test'), version)
+
+        # Nor does a bump in a rolled back transaction
+        version = get_cache_version('test')
+        with self.captureOnCommitCallbacks(execute=False):
+            bump_cache_version('test')
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_cache_version('test')
+        self.assertNotEqual(get_cache_version('test'), version)
+
+class RoleTest(TestCase):
+    def test_roles(self):
+        manager = User.objects.create_user("manager", 'jello@example.com', 'password')
+        manager.change_group("Manager")
+        manager = User.objects.get(pk=manager.pk)
+
+        # The groups are only loaded once
+        with self.assertNumQueries(1):
+            self.assertTrue(is_manager(manager))
+            self.assertTrue(is_manager(manager))
+            self.assertFalse(in_group(manager, "Team"))
+
+        manager.change_group("Team")
+        self.assertFalse(is_manager(manager))
+
+class SuperuserEmailCacheTest(TestCase):
+    def test_superuser_emails(self):
+        admin = User.objects.create_user("admin", 'admin@example.com', 'password')
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.change_group("Superuser")
+        self.assertEqual(get_superuser_emails(), ['admin@example.com'])
+
+        # Logging in does not reload the emails
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.last_login = timezone.now()
+            admin.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_superuser_emails(), ['admin@example.com'])
+
+        # Group changes do
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.change_group("Team")
+        self.assertEqual(get_superuser_emails(), [])
+
+class FieldAccessTest(TestCase):
+    def test_access_matrix(self):
+        team = User.objects.create_user("test", 'jello@example.com', 'password')
+        fields = []
+        for name in ["one", "two", "three"]:
+            field = Field(name=name)
+            field.save()
+            fields.append(field)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fields[0].teams.add(team)
+            fields[2].teams.add(team)
+        self.assertEqual(get_team_fields(team), [fields[0].pk, fields[2].pk])
+        self.assertEqual(get_matrix().get_teams(fields[2].pk), [team.pk])
+        with self.assertNumQueries(0):
+            self.assertFalse(get_matrix().can_book(team.pk, fields[1].pk))
+
+        # Only the difference is written (one read, then one delete and one insert in a savepoint)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(5):
+                set_team_fields(team, [str(fields[1].pk), str(fields[2].pk)])
+        self.assertEqual(get_team_fields(team), [fields[1].pk, fields[2].pk])
+        self.assertFalse(set_team_fields(team, [fields[1].pk, fields[2].pk]))
+
+        # Closed fields drop out
+        with self.captureOnCommitCallbacks(execute=True):
+            fields[1].active = False
+            fields[1].save()
+        self.assertEqual(get_team_fields(team), [fields[2].pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_field_teams(fields[2], [])
+        self.assertEqual(get_team_fields(team), [])
+
+class CsvExportTest(TestCase):
+    def setUp(self):
+        self.team = User.objects.create_user("test", 'jello@example.com', 'password')
+        TeamProfile(team=self.team, description="U12", age="U12").save()
+
+        self.field = Field(name="field")
+        self.field.save()
+
+        self.closed_field = Field(name="closed", active=False)
+        self.closed_field.save()
+
+        self.gametype = GameType(type="type")
+        self.gametype.save()
+
+        self.timeslot = TimeSlot(start_time=datetime.strptime("10:30", '%H:%M').time(), end_time=datetime.strptime("12:30", '%H:%M').time(), location=self.field)
+        self.timeslot.save()
+
+        self.date = datetime.strptime("01/01/2016", "%m/%d/%Y").date()
+        self.bounds = dict(start=self.date, end=self.date + timedelta(days=6))
+
+    def test_csv_rows(self):
+        for number in range(3):
+            Reservation(game_number=number, game_opponent="Opponent", gametype=self.gametype, date=self.date + timedelta(days=number), team=self.team, location=self.field, timeslot=self.timeslot, approved=True, age="U12", gender="girls").save()
+        for name in ["One", "Two"]:
+            tournament = Tournament(name=name, gametype=self.gametype, start_date=self.date, end_date=self.date)
+            tournament.save()
+            tournament.locations.add(self.field, self.closed_field)
+
+        # One query for the reservations, one for the tournaments and one for their fields
+        with self.assertNumQueries(3):
+            rows = list(get_csv_rows(self.bounds))
+
+        self.assertEqual(len(rows), 2 + 3 + 2 + 2)
+        self.assertEqual(rows[2], [0, "01/01/2016", "10:30 AM", "U12", "type", "Female", "field", "test (U12)", "Opponent", "", "", "", ""])
+        self.assertIn(["type Two", "field", "01/01/2016", "01/01/2016"], rows[-2:])
+
+    def test_csv_empty(self):
+        self.assertEqual(list(get_csv_rows(self.bounds))[2:], [["There are no reservations."]])
+
+class CleanDatabaseTest(TestCase):
+    def setUp(self):
+        self.team = User.objects.create_user("test", 'jello@example.com', 'password')
+
+        self.field = Field(name="field")
+        self.field.save()
+
+        self.gametype = GameType(type="type")
+        self.gametype.save()
+
+        self.timeslot = TimeSlot(start_time=datetime.strptime("10:30", '%H:%M').time(), end_time=datetime.strptime("12:30", '%H:%M').time(), location=self.field)
+        self.timeslot.save()
+
+    def test_clean_database(self):
+        old_date = datetime.strptime("01/01/2016", "%m/%d/%Y").date()
+        for number in range(5):
+            Reservation(game_number=number, game_opponent="Opponent", gametype=self.gametype, date=old_date + timedelta(days=number), team=self.team, location=self.field, timeslot=self.timeslot, active=number > 0).save()
+        current = Reservation(game_number=9, game_opponent="Opponent", gametype=self.gametype, date=timezone.now().date(), team=self.team, location=self.field, timeslot=self.timeslot)
+        current.save()
+
+        tournament = Tournament(name="Tournament", start_date=old_date, end_date=old_date, active=False)
+        tournament.save()
+        tournament.locations.add(self.field)
+
+        version = get_cache_version('schedule')
+        with self.captureOnCommitCallbacks(execute=True):
+            report = clean_database(force=True, chunk_size=2)
+        self.assertEqual(report['reservations'], 5)
+        self.assertEqual(report['tournaments'], 1)
+        self.assertNotEqual(get_cache_version('schedule'), version)
+        self.assertEqual(list(AvailabilityBlock.objects.exclude(reservation=current)), [])
+
+        self.assertEqual(list(Reservation.objects.all()), [current])
+        self.assertEqual(ArchivedReservation.objects.filter(team="test", location="field", deleted=True).count(), 1)
+        self.assertEqual(ArchivedTournament.objects.get().locations, "field")
+
+        # Already cleaned this week
+        self.assertIsNone(clean_database())
+
+    def test_clean_inactive(self):
+        used = TimeSlot(active=False, start_time=datetime.strptime("12:00", '%H:%M').time(), end_time=datetime.strptime("14:00", '%H:%M').time(), location=self.field)
+        used.save()
+        Reservation(game_number=1, game_opponent="Opponent", gametype=self.gametype, date=timezone.now().date(), team=self.team, location=self.field, timeslot=used).save()
+        for hour in range(10, 15):
+            TimeSlot(active=False, start_time=datetime.strptime("{}:00".format(hour), '%H:%M').time(), end_time=datetime.strptime("{}:30".format(hour), '%H:%M').time(), location=self.field).save()
+
+        unused = GameType(type="unused", active=False)
+        unused.save()
+        self.gametype.active = False
+        self.gametype.save()
+
+        self.assertEqual(clean_timeslots(), 5)
+        self.assertEqual(clean_gametypes(), 1)
+        self.assertEqual(clean_teams(), 0)
+        self.assertEqual(set(TimeSlot.objects.values_list('pk', flat=True)), set([self.timeslot.pk, used.pk]))
+        self.assertEqual(list(GameType.objects.all()), [self.gametype])
+
+    def test_compact_timeslots(self):
+        start = datetime.strptime("10:00", '%H:%M').time()
+        end = datetime.strptime("11:00", '%H:%M').time()
+
+        canonical = TimeSlot(active=False, start_time=start, end_time=end, location=self.field)
+        canonical.save()
+        duplicate = TimeSlot(active=False, start_time=start, end_time=end, location=self.field)
+        duplicate.save()
+        duplicate.overlap.add(self.timeslot)
+
+        date = timezone.now().date()
+        reservation = Reservation(game_number=1, game_opponent="Opponent", gametype=self.gametype, date=date, team=self.team, location=self.field, timeslot=duplicate)
+        reservation.save()
+
+        self.assertEqual(compact_timeslots(), 1)
+        self.assertEqual(Reservation.objects.get().timeslot, canonical)
+        self.assertEqual(list(canonical.overlap.all()), [self.timeslot])
+        self.assertEqual(get_blocked(date), (set([canonical.pk, self.timeslot.pk]), set()))
+
+        # Nothing left to merge
+        self.assertEqual(compact_timeslots(), 0)
+        self.assertEqual(prune_overlaps(), 0)
+
+        # An overlap between timeslots that do not overlap is pruned
+        later = TimeSlot(active=False, start_time=datetime.strptime("13:00", '%H:%M').time(), end_time=datetime.strptime("14:00", '%H:%M').time(), location=self.field)
+        later.save()
+        TimeSlot.overlap.through.objects.bulk_create([
+            TimeSlot.overlap.through(from_timeslot=later, to_timeslot=canonical),
+            TimeSlot.overlap.through(from_timeslot=canonical, to_timeslot=later)
+        ])
+        self.assertEqual(prune_overlaps(), 1)
+        self.assertEqual(list(canonical.overlap.all()), [self.timeslot])
+
+class OverlapTest(TestCase):
+    def setUp(self):
+        self.team = User.objects.create_user("test", 'jello@example.com', 'password')
+
+        self.field = Field(name="field")
+        self.field.save()
+
+        self.gametype = GameType(type="type")
+        self.gametype.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.timeslot1 = TimeSlot(start_time=datetime.strptime("10:30", '%H:%M').time(), end_time=datetime.strptime("12:30", '%H:%M').time(), location=self.field)
+            self.timeslot1.save()
+
+            self.timeslot2 = TimeSlot(start_time=datetime.strptime("13:00", '%H:%M').time(), end_time=datetime.strptime("15:00", '%H:%M').time(), location=self.field)
+            self.timeslot2.save()
+
+            self.custom = TimeSlot(active=False, start_time=datetime.strptime("12:00", '%H:%M').time(), end_time=datetime.strptime("14:00", '%H:%M').time(), location=self.field)
+            self.custom.save()
+
+        self.date = datetime.strptime("01/01/2016", "%m/%d/%Y").date()
+
+    def test_interval_tree(self):
+        intervals = [(start, start + length, (start, length)) for start in range(0, 100, 3) for length in (1, 5, 20)]
+        tree = IntervalTree(intervals)
+        for start, end in [(0, 1), (10, 12), (50, 90), (99, 200), (200, 300)]:
+            expected = [value for interval_start, interval_end, value in intervals if interval_start < end and interval_end > start]
+            self.assertEqual(sorted(tree.query(start, end)), sorted(expected))
+
+    def test_overlaps(self):
+        # The stored overlaps match the tree
+        self.assertEqual(get_overlapping(self.custom), set([self.timeslot1.pk, self.timeslot2.pk]))
+        self.assertEqual(set(self.custom.overlap.values_list('pk', flat=True)), set([self.timeslot1.pk, self.timeslot2.pk]))
+
+        # The tree is cached until a timeslot on the field changes (only the version stamp is checked)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_overlapping(self.timeslot1), set([self.custom.pk]))
+
+        # A reservation on the custom timeslot conflicts with both regular timeslots
+        reservation = Reservation(game_number=1, game_opponent="Opponent", gametype=self.gametype, date=self.date, team=self.team, location=self.field, timeslot=self.custom)
+        reservation.save()
+        self.assertEqual(list(get_conflicts(self.date, self.timeslot2)), [reservation])
+        self.assertFalse(get_conflicts(self.date, self.custom, exclude=[reservation.pk]).exists())
+
+    def test_overlap_links(self):
+        # Unused custom timeslots are linked as well, since they can be booked later
+        with self.captureOnCommitCallbacks(execute=True):
+            other = TimeSlot(active=False, start_time=datetime.strptime("12:35", '%H:%M').time(), end_time=datetime.strptime("12:55", '%H:%M').time(), location=self.field)
+            other.save()
+        self.assertEqual(set(other.overlap.values_list('pk', flat=True)), set([self.custom.pk]))
+
+        # Moving a timeslot to another field expires the tree of the field it left
+        get_overlapping(self.custom)
+        field = Field(name="other field")
+        field.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.timeslot2.location = field
+            self.timeslot2.save()
+        self.assertEqual(get_overlapping(self.custom), set([self.timeslot1.pk, other.pk]))
+        self.assertEqual(set(self.custom.overlap.values_list('pk', flat=True)), set([self.timeslot1.pk, other.pk]))
+
+    def test_timeslot_form_conflicts(self):
+        early = TimeSlot(active=False, start_time=datetime.strptime("09:00", '%H:%M').time(), end_time=datetime.strptime("10:00", '%H:%M').time(), location=self.field)
+        early.save()
+        for timeslot in (self.timeslot1, early):
+            Reservation(game_number=1, game_opponent="Opponent", gametype=self.gametype, date=self.date, team=self.team, location=self.field, timeslot=timeslot).save()
+
+        # Moving timeslot1 onto the custom timeslot's reservation is turned away with a form error
+        form = TimeSlotForm({ 'start_time': "09:30", 'end_time': "11:30" }, instance=TimeSlot.objects.get(pk=self.timeslot1.pk))
+        self.assertFalse(form.is_valid())
+        self.assertIn("01/01/2016", str(form.errors))
+
+        form = TimeSlotForm({ 'start_time': "10:00", 'end_time': "12:00" }, instance=TimeSlot.objects.get(pk=self.timeslot1.pk))
+        self.assertTrue(form.is_valid())
+
+    def test_no_overlap_constraint(self):
+        custom = Reservation(game_number=1, game_opponent="Opponent", gametype=self.gametype, date=self.date, team=self.team, location=self.field, timeslot=self.custom)
+        self.assertTrue(save_reservation(custom))
+
+        # The database turns away overlapping reservations, even without the check before saving
+        reservation = Reservation(game_number=2, game_opponent="Opponent", gametype=self.gametype, date=self.date, team=self.team, location=self.field, timeslot=self.timeslot2)
+        self.assertFalse(save_reservation(reservation))
+        reservation.date = self.date + timedelta(days=1)
+        self.assertTrue(save_reservation(reservation))
+
+        # Inactive reservations don't count
+        custom.active = False
+        custom.save()
+        other = Reservation(game_number=3, game_opponent="Opponent", gametype=self.gametype, date=self.date, team=self.team, location=self.field, timeslot=self.timeslot1)
+        self.assertTrue(save_reservation(other))
+        custom.active = True
+        self.assertFalse(save_reservation(custom))
+
+        # Reservations can still trade places
+        form = SwapForm({ 'swap-with-{}'.format(reservation.pk): other.pk, 'swap-with-{}'.format(other.pk): reservation.pk }, reservations=Reservation.objects.filter(pk__in=[reservation.pk, other.pk]))
+        self.assertTrue(form.is_valid())
+        self.assertEqual(len(form.save()), 2)
+        self.assertEqual(Reservation.objects.get(pk=other.pk).timeslot, self.timeslot2)
+
+        # A reservation that sneaks in after validation turns the swap away at the end, not with a 500
+        form = SwapForm({ 'swap-with-{}'.format(reservation.pk): other.pk, 'swap-with-{}'.format(other.pk): reservation.pk }, reservations=Reservation.objects.filter(pk__in=[reservation.pk, other.pk]))
+        self.assertTrue(form.is_valid())
+        reservation.date = self.date + timedelta(days=5)
+        reservation.save()
+        self.assertTrue(save_reservation(custom))
+        self.assertIsNone(form.save())
+        self.assertTrue(form.errors)
+        self.assertEqual(Reservation.objects.get(pk=other.pk).timeslot, self.timeslot2)
+
+        # And the constraint is checked right away again afterwards
+        reservation.date = self.date
+        self.assertFalse(save_reservation(reservation))
+
+class ApproveReservationsTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", 'admin@example.com', 'password')
+        self.admin.change_group("Superuser")
+
+        self.team = User.objects.create_user("test", 'jello@example.com', 'password')
+
+        self.field = Field(name="field")
+        self.field.save()
+
+        self.gametype = GameType(type="type")
+        self.gametype.save()
+
+        self.timeslot = TimeSlot(start_time=datetime.strptime("10:30", '%H:%M').time(), end_time=datetime.strptime("12:30", '%H:%M').time(), location=self.field)
+        self.timeslot.save()
+
+        self.reservations = []
+        for number in range(3):
+            reservation = Reservation(game_number=number, game_opponent="Opponent", gametype=self.gametype, date=timezone.now().date() + timedelta(days=number), team=self.team, location=self.field, timeslot=self.timeslot)
+            reservation.save()
+            self.reservations.append(reservation)
+
+    def test_approve_reservations(self):
+        self.client.login(username='admin', password='password')
+
+        response = self.client.post(reverse('api_approve_reservations'), { 'reservations': [reservation.pk for reservation in self.reservations], 'approved': 'true' }, secure=True)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(Reservation.objects.filter(approved=True).count(), 3)
+        self.assertEqual(LogEntry.objects.filter(change_message__startswith="Approved Reservation").count(), 3)
+        self.assertEqual(send_queued_emails(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['admin@example.com', 'jello@example.com'])
+
+        # Already approved reservations are skipped
+        response = self.client.post(reverse('api_approve_reservations'), { 'reservations': [self.reservations[0].pk], 'approved': 'true' }, secure=True)
+        self.assertEqual(response.json()['reservations'], [])
+
+        response = self.client.post(reverse('api_approve_reservations'), { 'reservations': [self.reservations[0].pk] }, secure=True)
+        self.assertEqual(response.json()['reservations'], [self.reservations[0].pk])
+        self.assertEqual(Reservation.objects.filter(approved=True).count(), 2)
+        self.assertEqual(send_queued_emails(), 0)
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.team = User.objects.create_user("test", 'jello@example.com', 'password')
+
+    def test_outbox(self):
+        send_email("New Team", 'reservations/email/new_team_done.html', { 'team': self.team }, [self.team.email, ""])
+        self.assertEqual(len(mail.outbox), 0)
+
+        # The team is loaded again when the email is rendered
+        self.team.username = "renamed"
+        self.team.save()
+
+        self.assertEqual(send_queued_emails(), 1)
+        self.assertEqual(mail.outbox[0].to, ['jello@example.com'])
+        self.assertIn("renamed", mail.outbox[0].body)
+        self.assertEqual(OutboundEmail.objects.get().context, {})
+
+    def test_new_team_email(self):
+        send_email("New Team", 'reservations/email/new_team.html', { 'team': self.team, 'link': reverse('login') }, [self.team.email])
+        self.assertEqual(OutboundEmail.objects.get().context['team'], { '__model__': 'auth.User', 'pk': self.team.pk })
+
+        # The password link is only made when the email is sent
+        self.assertEqual(send_queued_emails(), 1)
+        link = re.search(r'/accounts/reset/\S+', mail.outbox[0].body).group(0)
+        response = self.client.get(link, secure=True, follow=True)
+        self.assertTrue(response.context['validlink'])
+
+    def test_outbox_retry(self):
+        send_email("Broken", 'reservations/email/missing.html', {}, [self.team.email])
+
+        self.assertEqual(send_queued_emails(), 1)
+        email = OutboundEmail.objects.get()
+        self.assertIsNone(email.sent)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt, timezone.now())
+
+        # Not due again yet
+        self.assertEqual(send_queued_emails(), 0)
+
+class ScheduleAPITest(TestCase):
+    def setUp(self):
+        # Runs the version bumps now, so that a test's own bumps are not folded into them
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team = User.objects.create_user("test", 'jello@example.com', 'password')
+            self.team.change_group("Team")
+
+            self.field = Field(name="field")
+            self.field.save()
+
+            self.gametype = GameType(type="type")
+            self.gametype.save()
+
+            self.timeslot = TimeSlot(start_time=datetime.strptime("10:30", '%H:%M').time(), end_time=datetime.strptime("12:30", '%H:%M').time(), location=self.field)
+            self.timeslot.save()
+            later = TimeSlot(start_time=datetime.strptime("12:30", '%H:%M').time(), end_time=datetime.strptime("14:30", '%H:%M').time(), location=self.field)
+            later.save()
+
+            self.date = datetime.strptime("01/01/2016", "%m/%d/%Y").date()
+            for day in range(5):
+                for number, timeslot in enumerate([self.timeslot, later]):
+                    Reservation(game_number=number, game_opponent="Opponent", gametype=self.gametype, date=self.date + timedelta(days=day), team=self.team, location=self.field, timeslot=timeslot, approved=True).save()
+
+        self.client.login(username='test', password='password')
+
+    def test_reservation_pages(self):
+        # Unpaged lists are returned as before
+        response = self.client.get(reverse('api_reservation_list'), secure=True)
+        self.assertEqual(len(response.json()), 10)
+
+        # Pages follow (date, id) without gaps or repeats
+        seen = []
+        url = reverse('api_reservation_list') + "?limit=3&start=2016-01-02"
+        while url:
+            page = self.client.get(url, secure=True).json()
+            seen.extend(reservation['id'] for reservation in page['results'])
+            url = page['next']
+        self.assertEqual(seen, list(Reservation.objects.filter(date__gte=self.date + timedelta(days=1)).order_by('date', 'id').values_list('id', flat=True)))
+
+        response = self.client.get(reverse('api_reservation_list') + "?cursor=bad", secure=True)
+        self.assertEqual(response.status_code, 400)
+
+    def test_team_counts(self):
+        response = self.client.get(reverse('api_team_list') + "?end=2016-01-02", secure=True)
+        self.assertEqual(response.json()[0]['reservation_count'], 4)
+        self.assertEqual(len(response.json()[0]['reservation_set']), 4)
+
+    def test_fast_path(self):
+        TeamProfile(team=self.team, description="Description", age="U10").save()
+        reservations = Reservation.objects.filter(active=True, approved=True).order_by('date', 'id')
+
+        with self.assertNumQueries(1):
+            rows = serialize_reservation_rows(reservation_values(reservations))
+        self.assertEqual(rows, ReservationSerializer(reservations, many=True).data)
+        self.assertEqual(rows[0]['team']['fullname'], "test (Description)")
+
+    def test_team_name(self):
+        self.assertEqual(set(Reservation.objects.values_list('team_name', flat=True)), set(["test"]))
+
+        profile = TeamProfile(team=self.team, description="Description", age="U10")
+        profile.save()
+        self.assertEqual(set(Reservation.objects.values_list('team_name', flat=True)), set(["test (Description)"]))
+
+        self.team.username = "renamed"
+        self.team.save()
+        with self.assertNumQueries(1):
+            names = [str(reservation) for reservation in Reservation.objects.select_related('location')]
+        self.assertEqual(set(names), set(["renamed (Description) @ field"]))
+
+        profile.delete()
+        self.assertEqual(set(Reservation.objects.values_list('team_name', flat=True)), set(["renamed"]))
+
+    def test_resv_count(self):
+        Reservation.objects.filter(date=self.date).update(date=timezone.localtime(timezone.now()).date())
+        request = EmptyObject()
+        request.user = self.team
+        self.assertEqual(resv_count({ 'request': request }), "2")
+
+        # Cached until a reservation changes
+        Reservation.objects.filter(date=self.date + timedelta(days=1)).update(date=timezone.localtime(timezone.now()).date() + timedelta(days=1))
+        self.assertEqual(resv_count({ 'request': request }), "2")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.filter(date__lt=timezone.localtime(timezone.now()).date()).first().delete()
+        self.assertEqual(resv_count({ 'request': request }), "4")
+
+    def test_calendar_events(self):
+        url = reverse('calendar_events')
+        response = self.client.get(url, { 'type': 'reservations', 'start': '2016-01-02', 'end': '2016-01-04' }, secure=True)
+        self.assertEqual(len(response.json()), 4)
+        self.assertEqual(response.json()[0]['title'], "test @ field")
+        self.assertEqual(response.json()[0]['start'], "2016-01-02T10:30:00")
+
+        # Cached until a reservation changes
+        Reservation.objects.filter(date="2016-01-02").update(active=False)
+        response = self.client.get(url, { 'type': 'reservations', 'start': '2016-01-02', 'end': '2016-01-04' }, secure=True)
+        self.assertEqual(len(response.json()), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.filter(date="2016-01-03").first().save()
+        response = self.client.get(url, { 'type': 'reservations', 'start': '2016-01-02', 'end': '2016-01-04' }, secure=True)
+        self.assertEqual(len(response.json()), 2)
+
+        Tournament(name="Tournament", start_date=self.date, end_date=self.date + timedelta(days=1)).save()
+        response = self.client.get(url, { 'type': 'tournaments', 'gametype': 'none', 'start': '2016-01-02', 'end': '2016-01-04' }, secure=True)
+        self.assertEqual(response.json()[0]['end'], "2016-01-03")
+
+        response = self.client.get(url, { 'type': 'reservations', 'start': '2016-01-02', 'end': '2017-01-04' }, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+    def test_dashboard_fragments(self):
+        self.assertContains(self.client.get(reverse('dashboard'), secure=True), "gametype-{}".format(self.gametype.pk))
+
+        # The gametypes are only loaded when a gametype changes, not with every reservation
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.first().save()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('dashboard'), secure=True)
+        self.assertFalse([query for query in queries if 'reservations_gametype' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gametype = GameType(type="other")
+            gametype.save()
+        self.assertContains(self.client.get(reverse('dashboard'), secure=True), "gametype-{}".format(gametype.pk))
+
+    def test_snapshots(self):
+        with tempfile.TemporaryDirectory() as root, self.settings(SCHEDULE_SNAPSHOT_ROOT=root):
+            self.assertTrue(publish_schedule())
+            self.assertFalse(publish_schedule())
+            self.assertIn(b"gametype-", open(os.path.join(root, 'index.html'), 'rb').read())
+
+            # Anonymous visitors get the snapshot, and logged in users the live page
+            response = self.client.get(reverse('dashboard'), secure=True)
+            self.assertFalse(response.streaming)
+            self.client.logout()
+            self.client.cookies.clear()
+            response = self.client.get(reverse('dashboard'), secure=True)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+            response = self.client.get('/schedule/games.json', secure=True)
+            self.assertEqual(response['Content-Type'], 'application/json')
+
+            # Out of date once the schedule changes, until it is published again
+            with self.captureOnCommitCallbacks(execute=True):
+                Reservation.objects.first().save()
+            response = self.client.get(reverse('dashboard'), secure=True)
+            self.assertFalse(response.streaming)
+
+            self.assertTrue(publish_schedule())
+            self.client.cookies.clear()
+            response = self.client.get(reverse('dashboard'), secure=True)
+            self.assertTrue(response.streaming)
+
+    def test_conditional_get(self):
+        url = reverse('api_reservation_list')
+        response = self.client.get(url, secure=True)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+
+        # Nothing changed
+        response = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A reservation changed
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.first()
+            reservation.game_opponent = "Someone Else"
+            reservation.save()
+        response = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_conditional_get_on_timeslot(self):
+        url = reverse('api_reservation_list')
+        etag = self.client.get(url, secure=True)['ETag']
+
+        # The times come from the timeslot, which is updated without saving the reservations
+        with self.captureOnCommitCallbacks(execute=True):
+            self.timeslot.start_time = datetime.strptime("09:30", '%H:%M').time()
+            self.timeslot.save()
+        response = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['timeslot']['start_time'], "09:30 AM")
+
+class EditorBenchmarkTest(TestCase):
+    def test_benchmark(self):
+        league = seed_league(teams=4, fields=2, timeslots=2, weeks=2, tournaments=1)
+        report = run_benchmark(league, users=1, rounds=4, days=1)
+
+        self.assertEqual(sum(report['outcomes'].values()), 4)
+        self.assertEqual(report['outcomes']['error'], 0)
+        self.assertTrue(report['outcomes']['booked'])
+        self.assertEqual(len(report['steps']['new_reservation']), 4)
+        self.assertTrue(format_report(report))
+
+# Makes sure the hot reservation/tournament queries use the indexes on a large schedule
+@skipUnlessDBFeature('supports_partial_indexes')
+class QueryPlanTest(TestCase):
+    SEQ_SCAN = re.compile(r'Seq Scan on reservations_(reservation|tournament)\b')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", 'admin@example.com', 'password')
+        cls.admin.change_group("Superuser")
+
+        teams = []
+        for number in range(40):
+            team = User.objects.create_user("team{}".format(number), 'jello@example.com', 'password')
+            team.change_group("Team")
+            teams.append(team)
+        cls.team = teams[0]
+
+        gametype = GameType.objects.create(type="type")
+
+        timeslots = []
+        for number in range(10):
+            field = Field.objects.create(name="field{}".format(number))
+            for hour in range(8, 16, 2):
+                timeslots.append(TimeSlot(start_time=datetime.strptime(str(hour), '%H').time(), end_time=datetime.strptime(str(hour + 2), '%H').time(), location=field))
+        TimeSlot.objects.bulk_create(timeslots)
+        cls.timeslot = timeslots[0]
+
+        # Two years of history, and the next two weeks
+        today = timezone.localtime(timezone.now()).date()
+        reservations = []
+        for number in range(20000):
+            team = teams[number % len(teams)]
+            # Each timeslot is only used once per day
+            timeslot = timeslots[number // 744 % len(timeslots)]
+            reservations.append(Reservation(
+                game_number=number, game_opponent="Opponent", date=today + timedelta(days=14 - number % 744), team=team, team_name=team.username,
+                location_id=timeslot.location_id, gametype=gametype, timeslot=timeslot, time_range=get_time_range(timeslot), approved=number % 20 != 0, active=number % 10 != 0, age="U10"
+            ))
+        Reservation.objects.bulk_create(reservations)
+
+        tournaments = []
+        for number in range(2000):
+            start_date = today + timedelta(days=14 - number % 744)
+            tournaments.append(Tournament(name="Tournament", start_date=start_date, end_date=start_date + timedelta(days=2), gametype=gametype))
+        Tournament.objects.bulk_create(tournaments)
+
+        # Don't let the dashboard clean (and archive) the schedule
+        WebsiteSetting.objects.update_or_create(key='LAST_CLEAN_DATE', defaults={ 'value': date_bounds()['start'].strftime('%m/%d/%Y') })
+        expire_website_settings(reload=True)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    # Explains every query on reservations/tournaments, and fails on a sequential scan
+    def assertIndexed(self, queries):
+        explained = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                # Chunked reads (.iterator()) go through a server-side cursor
+                sql = re.sub(r'^DECLARE .+? CURSOR .*?FOR ', '', query['sql'])
+                if not sql.startswith('SELECT') or not re.search(r'"reservations_(reservation|tournament)"', sql):
+                    continue
+
+                cursor.execute("EXPLAIN " + sql)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                self.assertIsNone(self.SEQ_SCAN.search(plan), "{}\n{}".format(sql, plan))
+                explained += 1
+
+        self.assertTrue(explained)
+
+    def test_dashboard(self):
+        self.client.login(username='admin', password='password')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('dashboard'), secure=True).status_code, 200)
+        self.assertIndexed(queries)
+
+        bounds = date_bounds()
+        with CaptureQueriesContext(connection) as queries:
+            for event_type in ('reservations', 'tournaments'):
+                self.client.get(reverse('calendar_events'), { 'type': event_type, 'start': bounds['start'].isoformat(), 'end': bounds['end'].isoformat() }, secure=True)
+        self.assertIndexed(queries)
+
+        with CaptureQueriesContext(connection) as queries:
+            list(get_csv_rows(bounds))
+        self.assertIndexed(queries)
+
+    def test_all_reservations(self):
+        self.client.login(username='admin', password='password')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('all_reservations'), secure=True).status_code, 200)
+        self.assertIndexed(queries)
+
+    def test_my_reservations(self):
+        self.client.login(username='team0', password='password')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('my_reservations'), secure=True).status_code, 200)
+        self.assertIndexed(queries)
+
+    def test_editor(self):
+        date = timezone.localtime(timezone.now()).date() + timedelta(days=7)
+
+        request = EmptyObject()
+        request.user = self.admin
+        request.session = { 'resv_team': self.team.pk, 'resv_date': date.strftime("%m/%d/%Y") }
+
+        with CaptureQueriesContext(connection) as queries:
+            EditorStep2Form().populate_form(request)
+            list(get_conflicts(date, self.timeslot))
+        self.assertIndexed(queries)
+
+    def test_resv_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            for user in (self.admin, self.team):
+                request = EmptyObject()
+                request.user = user
+                resv_count({ 'request': request })
+        self.assertIndexed(queries)
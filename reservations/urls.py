@@ -24,6 +24,7 @@ urlpatterns = [
     re_path(r"^accounts/change-email/$", views.change_email, name="change_email"),
     re_path(r"^accounts/change-password/$", views.change_password, name="change_password"),
     re_path(r"^csv/$", views.get_csv, name="get_csv"),
+    re_path(r"^calendar/events/$", views.calendar_events, name="calendar_events"),
     re_path(r"^recovery/(?P<reservation_id>[0-9]+)/$", views.recovery_reservation, name="recovery_reservation"),
 
     # Admin Views
@@ -77,6 +78,7 @@ urlpatterns = [
     re_path(r"^api/modifyFields/$", api_views.APITeamModifyFields.as_view(), name="api_team_modify_fields"),
     re_path(r"^api/modifyTeams/$", api_views.APIFieldModifyTeams.as_view(), name="api_field_modify_teams"),
     re_path(r"^api/modifyManagers/$", api_views.APIManagerModifyTeams.as_view(), name="api_manager_modify_teams"),
+    re_path(r"^api/approveReservations/$", api_views.APIApproveReservations.as_view(), name="api_approve_reservations"),
     re_path(r"^api/reservation/$", api_views.APIReservationList.as_view(), name="api_reservation_list"),
     re_path(r"^api/reservation/(?P<pk>[0-9]+)/$", api_views.APIReservationDetail.as_view(), name="api_reservation_detail"),
     re_path(r"^api/tournament/$", api_views.APITournamentList.as_view(), name="api_tournament_list"),
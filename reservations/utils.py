@@ -1,8 +1,8 @@
 # Misc. Utilities For All
 from django.shortcuts import get_object_or_404
 from django.contrib import messages
-from django.core.mail import send_mail
-from django.template.loader import get_template
+from django.core.cache import cache
+from django.db import transaction
 from django.conf import settings
 from django.utils import timezone
 from datetime import datetime as dt
@@ -17,6 +17,7 @@ from dateutil.relativedelta import *
 
 from django.contrib.auth.models import User
 from reservations.models import Reservation, ReservationToken, Tournament, WebsiteSetting
+from reservations.outbox import queue_emails
 
 """ Misc. Helper Functions """
 # Displays all form errors
@@ -60,25 +61,24 @@ def clean_tournaments():
         tournament.delete()
 
 """ Email Functions """
+# Emails are queued, and sent by the send_emails worker once the current transaction commits
+
 # Sends an email
 def send_email(title, template, context, to_emails):
-    send_mail(settings.EMAIL_SUBJECT_PREFIX + title, get_template(template).render(context), settings.SERVER_EMAIL, to_emails, fail_silently=True)
+    queue_emails([(title, template, context, to_emails)])
 
 # Sends an email to superusers and optional others
 def send_email_superusers(title, template, context, to_emails=[]):
-    emails = []
-    users = User.objects.filter(groups__name='Superuser')
-
-    for user in users:
-        if user.email and not user.email in to_emails:
-            emails.append(user.email)
-        if not user:
-            continue
-
+    emails = [email for email in get_superuser_emails() if not email in to_emails]
     all_emails = emails + to_emails
 
     send_email(title, template, context, all_emails)
 
+# Sends a batch of emails
+# Format: [(title, template, context, to_emails), ...]
+def send_emails(emails):
+    queue_emails(emails)
+
 """ Date Calculation Functions """
 # Defines the date bounds of this week (The week starts on Sunday)
 # The default start bound is this last Saturday (-1)
@@ -135,15 +135,119 @@ def has_reservation_block(request, resv_date):
 
     return False
 
+""" Cache Functions """
+# Gets the version stamp of a cached resource.
+# The stamp lives in the shared cache, so every worker sees the same one.
+# Stamps start at the time they were created (in milliseconds), so they keep going up if the cache is flushed
+def get_cache_version(name):
+    key = 'version:' + name
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key, 0)
+
+    return version
+
+# Bumps the version stamp of a cached resource once the current transaction commits
+# A batch that saves or deletes many rows only bumps each stamp once: every call registers
+# its own callback (so a rolled back savepoint only drops its own), but the pending callbacks
+# for a stamp share a token, and only the first one to run bumps it.
+def bump_cache_version(name):
+    connection = transaction.get_connection()
+    if not hasattr(connection, 'cache_version_tokens'):
+        connection.cache_version_tokens = {}
+    tokens = connection.cache_version_tokens
+
+    token = tokens.get(name)
+    if token is None or token['done']:
+        token = tokens[name] = { 'done': False }
+
+    def bump():
+        if token['done']:
+            return
+        token['done'] = True
+        if tokens.get(name) is token:
+            del tokens[name]
+
+        # An atomic increment, so workers bumping at the same time never write the same stamp
+        key = 'version:' + name
+        cache.add(key, int(time.time() * 1000), None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted in between
+            cache.add(key, int(time.time() * 1000), None)
+
+    transaction.on_commit(bump)
+
+# A value that is loaded from the database and kept in this process
+# The shared version stamp is checked once per request (or every max_age seconds
+# outside of requests), and the value is loaded again when the stamp changes.
+class VersionedValue(object):
+    # Every versioned value, so that they can all be expired when a request starts
+    instances = []
+
+    def __init__(self, name, loader, max_age=30):
+        self.name = name
+        self.loader = loader
+        self.max_age = max_age
+
+        self.version = None
+        self.value = None
+        self.expires = 0
+
+        VersionedValue.instances.append(self)
+
+    def get(self):
+        if time.monotonic() >= self.expires:
+            version = get_cache_version(self.name)
+
+            if version != self.version:
+                self.value = self.loader()
+                self.version = version
+
+            self.expires = time.monotonic() + self.max_age
+
+        return self.value
+
+    # Makes the next lookup check the version stamp (or reload, if forced)
+    def expire(self, reload=False):
+        self.expires = 0
+        if reload:
+            self.version = None
+
+    # Bumps the version stamp, and reloads the value here once the transaction commits
+    def bump(self):
+        bump_cache_version(self.name)
+        transaction.on_commit(lambda: self.expire(reload=True))
+
+# Makes every versioned value check its version stamp on its next lookup
+def expire_versioned_values():
+    for value in VersionedValue.instances:
+        value.expire()
+
 """ Website Settings """
+# Every setting is loaded with one query and kept in this process.
+WEBSITE_SETTINGS_MAX_AGE = 30
+_website_settings = VersionedValue('website_settings', lambda: dict(WebsiteSetting.objects.values_list('key', 'value')), WEBSITE_SETTINGS_MAX_AGE)
+
+# Gets all website settings as a key/value dictionary
+def get_website_settings():
+    return _website_settings.get()
+
+# Makes the next lookup check the version stamp (or reload, if forced)
+def expire_website_settings(reload=False):
+    _website_settings.expire(reload)
+
+# Bumps the website settings' version stamp
+def bump_website_settings():
+    _website_settings.bump()
+
 # Gets the desired website setting's value
 # Returns the default (None) if it does not exist.
 def get_website_setting(key, default=None):
-    setting = get_object_or_none(WebsiteSetting, key=key)
-    if setting:
-        return setting.value
-    else:
-        return default
+    return get_website_settings().get(key, default)
 
 # Sets the desired website setting
 # Returns True if successful
@@ -156,11 +260,30 @@ def set_website_setting(key, value):
     return False
 
 """ Auth Functions """
+# The superusers' emails are kept in this process, and reloaded when a user or group membership changes
+_superuser_emails = VersionedValue('superusers', lambda: [email for email in User.objects.filter(groups__name='Superuser').values_list('email', flat=True) if email])
+
+# Gets the emails of all superusers (that have one)
+def get_superuser_emails():
+    return list(_superuser_emails.get())
+
+# Bumps the superusers' version stamp
+def bump_superusers():
+    _superuser_emails.bump()
+
+# Gets the names of this user's groups
+# They are loaded once and kept on the user (see reservations.middleware.RoleMiddleware).
+def get_roles(user):
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    if not hasattr(user, '_roles'):
+        user._roles = frozenset(user.groups.values_list('name', flat=True))
+    return user._roles
+
 # Returns whether this user is in a group
 def in_group(user, group):
-    if user:
-        return user.groups.filter(name__in=[group]).exists()
-    return False
+    return group in get_roles(user)
 
 # Returns whether this user is a Superuser
 def is_superuser(user, *args, **kwargs):
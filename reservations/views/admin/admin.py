@@ -9,15 +9,15 @@ from django.contrib.admin.models import CHANGE
 
 from django.contrib.auth.models import User
 from reservations.models import Reservation, Field, Tournament, GameType
-from reservations.decorators import superuser_required, clean_task, token_required
-from reservations.utils import send_email_superusers, log_message, message_errors, clear_tokens
+from reservations.decorators import superuser_required, clean_task
+from reservations.utils import send_email_superusers, log_message, message_errors
 from reservations.forms import SwapForm
 
 @superuser_required
 @clean_task
 def all_reservations(request):
-    pending = Reservation.objects.filter(active=True, date__gte=timezone.localtime(timezone.now()).date(), approved=False).select_related('timeslot', 'location', 'team', 'team__profile', 'gametype')
-    reservations = Reservation.objects.filter(active=True, date__gte=timezone.localtime(timezone.now()).date(), approved=True).select_related('timeslot', 'location', 'team', 'team__profile', 'gametype')
+    pending = Reservation.objects.filter(active=True, date__gte=timezone.localtime(timezone.now()).date(), approved=False).select_related('timeslot', 'location', 'team', 'gametype')
+    reservations = Reservation.objects.filter(active=True, date__gte=timezone.localtime(timezone.now()).date(), approved=True).select_related('timeslot', 'location', 'team', 'gametype')
     return render(request, 'reservations/admin/all_reservations.html', { 'pending': pending, 'reservations': reservations })
 
 @superuser_required
@@ -45,7 +45,6 @@ def old_reservations(request):
     return render(request, 'reservations/admin/old_reservations.html', { 'reservations': reservations })
 
 @superuser_required
-@token_required(block_all=True)
 @transaction.atomic
 def swap_reservations(request):
     ids = request.GET.get('ids', '').split(',')
@@ -60,11 +59,9 @@ def swap_reservations(request):
 
     if request.method == 'POST':
         form = SwapForm(request.POST, reservations=reservations)
-        if form.is_valid():
-            swapped_reservations = form.save()
-
-            clear_tokens(request)
+        swapped_reservations = form.save() if form.is_valid() else None
 
+        if swapped_reservations is not None:
             for reservation in swapped_reservations:
                 log_message(request, reservation, CHANGE, "Swapped Reservation: {} on {}".format(reservation, reservation.date.strftime('%m/%d/%Y')))
 
@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib import messages
-from django.db.models import Prefetch
 from django.utils.html import escape
 
 from django.contrib.admin.models import ADDITION, DELETION, CHANGE
@@ -10,21 +9,23 @@ from reservations.utils import message_errors, send_email, send_email_superusers
 from reservations.decorators import superuser_required
 
 from django.contrib.auth.models import User
-from reservations.models import Field
 from reservations.forms import CreateTeamForm
 from reservations.api.forms import APITeamModifyFieldsForm
+from reservations.access import get_matrix
 
 @superuser_required
 def all_teams(request):
-    temp_teams = User.objects.filter(is_active=True, groups__name='Team').order_by('username').select_related('profile').prefetch_related(Prefetch('field_set', queryset=Field.objects.filter(active=True), to_attr='fields'))
+    temp_teams = User.objects.filter(is_active=True, groups__name='Team').order_by('username').select_related('profile')
     teams = []
 
     form = APITeamModifyFieldsForm()
 
+    # Every team's fields come from the access matrix
+    matrix = get_matrix()
     for team in temp_teams:
         teams.append({
             'team': team,
-            'fields': [field.pk for field in team.fields]
+            'fields': matrix.get_fields(team.pk)
         })
 
     return render(request, 'reservations/admin/teams/all_teams.html', { 'teams': teams, 'form': form })
@@ -49,8 +50,9 @@ def new_team(request):
         if form.is_valid():
             teamDict = form.saveNew()
 
+            # The email links to a page where they choose their own password, so the password isn't queued with it
             if teamDict['team'].email:
-                send_email("New Team: {}".format(teamDict['team'].username), 'reservations/email/new_team.html', { 'team': teamDict['team'], 'password': teamDict['password'], 'link': reverse('login') }, [teamDict['team'].email])
+                send_email("New Team: {}".format(teamDict['team'].username), 'reservations/email/new_team.html', { 'team': teamDict['team'], 'link': reverse('login') }, [teamDict['team'].email])
 
             log_message(request, teamDict['team'], ADDITION, "New Team: {}".format(teamDict['team'].username))
             send_email_superusers("New Team: {}".format(teamDict['team'].username), 'reservations/email/new_team_done.html', { 'team': teamDict['team'] })
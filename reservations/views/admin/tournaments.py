@@ -7,8 +7,8 @@ from django.contrib.admin.models import ADDITION, DELETION, CHANGE
 
 from reservations.models import Tournament
 from reservations.forms import TournamentsForm
-from reservations.utils import message_errors, clear_tokens, send_email_superusers, clean_tournaments, log_message
-from reservations.decorators import superuser_required, token_required
+from reservations.utils import message_errors, send_email_superusers, clean_tournaments, log_message
+from reservations.decorators import superuser_required
 
 @superuser_required
 def all_tournaments(request):
@@ -18,7 +18,6 @@ def all_tournaments(request):
     return render(request, 'reservations/admin/tournaments/all_tournaments.html', { 'tournaments': tournaments, 'form': form })
 
 @superuser_required
-@token_required(block_all=True)
 def new_tournament(request):
     if request.method == 'POST':
         form = TournamentsForm(request.POST)
@@ -28,8 +27,6 @@ def new_tournament(request):
             log_message(request, tournament, ADDITION, "New Tournament: {}".format(tournament))
             send_email_superusers("New Tournament", 'reservations/email/new_tournament.html', { 'tournament': tournament })
 
-            clear_tokens(request)
-
             messages.success(request, "Created new tournament <b>{}</b>!".format(escape(tournament.name)))
             return redirect('all_tournaments')
         else:
@@ -39,7 +36,6 @@ def new_tournament(request):
     return render(request, 'reservations/admin/tournaments/edit_tournament.html', { 'form': form })
 
 @superuser_required
-@token_required(block_all=True)
 def edit_tournament(request, tournament_id):
     tournament = get_object_or_404(Tournament, pk=tournament_id)
     current_locations = tournament.locations.values_list('id', flat=True)
@@ -51,8 +47,6 @@ def edit_tournament(request, tournament_id):
             tournament = form.save()
             log_message(request, tournament, CHANGE, "Modified Tournament: {}".format(tournament))
 
-            clear_tokens(request)
-
             messages.success(request, "Modified tournament <b>{}</b>!".format(escape(tournament.name)))
             return redirect('all_tournaments')
         else:
@@ -1,40 +1,27 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
-import unicodecsv as csv
-from datetime import datetime
+from django.http import StreamingHttpResponse, JsonResponse, HttpResponseBadRequest
+from django.urls import reverse
+import csv
+from datetime import datetime, timedelta
 from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Count, Prefetch
 
 from django.contrib.admin.models import LogEntry
 from django.contrib.auth.models import User
-from reservations.models import Reservation, Tournament
-from reservations.utils import date_bounds, get_website_setting, is_superuser
+from reservations.models import Reservation, Tournament, Field, GameType
+from reservations.utils import date_bounds, get_website_setting, is_superuser, get_cache_version
 
-def dashboard(request):
-    # Break current reservations and tournaments up by gametype
-    # Format: { gametype1: { 'reservations': [resv1, resv2, ...], 'tournaments': [tour1, tour2, ...] }, gametype2: { ... }, ... }
-    reservations = Reservation.objects.filter(active=True, date__gte=date_bounds()['start'], approved=True).select_related('timeslot', 'location', 'team', 'team__profile', 'gametype')
-    tournaments = Tournament.objects.filter(active=True).select_related('gametype').prefetch_related('locations')
-
-    gametypes = {}
-    other_tournaments = []
-    for reservation in reservations:
-        if reservation.gametype in gametypes:
-            gametypes[reservation.gametype]['reservations'].append(reservation)
-        else:
-            gametypes[reservation.gametype] = { 'reservations': [reservation], 'tournaments': [] }
-    for tournament in tournaments:
-        # If this tournament doesn't have a gametype, put it aside
-        if not tournament.gametype:
-            other_tournaments.append(tournament)
-            continue
-        if tournament.gametype in gametypes:
-            gametypes[tournament.gametype]['tournaments'].append(tournament)
-        else:
-            gametypes[tournament.gametype] = { 'reservations': [], 'tournaments': [tournament] }
+# How long (in seconds) the dashboard widgets are cached
+DASHBOARD_WIDGETS_TIMEOUT = 60
 
+def dashboard(request):
+    # The calendar loads the events of the weeks it shows from calendar_events
+    # The gametype blocks are cached by the gametypes' version, so the gametypes are
+    # only loaded when one of those fragments has to be rendered again.
     context = {
-        'gametypes': gametypes,
-        'other_tournaments': other_tournaments
+        'gametypes': GameType.objects.filter(active=True),
+        'gametypes_version': get_cache_version('gametypes')
     }
 
     if is_superuser(request.user):
@@ -60,49 +47,147 @@ def get_widgets_context():
     # Teams Widget
     teams = User.objects.filter(is_active=True, groups__name='Team').order_by('username').select_related('profile').prefetch_related('groups')
 
-    # Stats Widget
+    context = {
+        'recent_activity': recent_activity,
+        'teams': teams
+    }
+    context.update(get_schedule_widgets())
+
+    return context
+
+# Gets the stats, pie and pending widgets
+# They are cached for a short time, and the cache is versioned by the schedule, so reservation,
+# tournament and approval changes show up right away.
+def get_schedule_widgets():
     bounds = date_bounds()
-    reservations = Reservation.objects.filter(active=True, approved=True, date__range=[bounds['start'], bounds['end']]).select_related('location')
-    tournaments = Tournament.objects.filter(active=True, start_date__lte=bounds['end'], end_date__gte=bounds['start']).prefetch_related('locations')
+    key = 'dashboard_widgets:{}:{}'.format(bounds['start'].isoformat(), get_cache_version('schedule'))
 
-    reservations_count = reservations.count()
-    tournaments_count = tournaments.count()
+    widgets = cache.get(key)
+    if widgets is not None:
+        return widgets
+
+    reservations = Reservation.objects.filter(active=True, approved=True, date__range=[bounds['start'], bounds['end']])
+    tournaments = Tournament.objects.filter(active=True, start_date__lte=bounds['end'], end_date__gte=bounds['start'])
 
     # Pie Widget
+    # Format: { field1: { 'label': name, 'count': 2, 'resv_count': 1, 'tour_count': 1 }, ... }
     field_data = {}
-    for reservation in reservations.iterator(chunk_size=2000):
-        if reservation.location in field_data:
-            field_data[reservation.location]['count'] += 1
-            field_data[reservation.location]['resv_count'] += 1
+    reservation_counts = reservations.order_by().values_list('location', 'location__name').annotate(count=Count('pk'))
+    for location, name, count in reservation_counts:
+        field_data[location] = { 'label': name, 'count': count, 'resv_count': count, 'tour_count': 0 }
+
+    tournament_counts = Field.objects.filter(active=True, tournament__in=tournaments).order_by().values_list('pk', 'name').annotate(count=Count('tournament'))
+    for location, name, count in tournament_counts:
+        if location in field_data:
+            field_data[location]['count'] += count
+            field_data[location]['tour_count'] = count
         else:
-            field_data[reservation.location] = { 'count': 1, 'resv_count': 1, 'tour_count': 0 }
-    for tournament in tournaments.iterator(chunk_size=2000):
-        for location in tournament.locations.filter(active=True):
-            if location in field_data:
-                field_data[location]['count'] += 1
-                field_data[location]['tour_count'] += 1
-            else:
-                field_data[location] = { 'count': 1, 'resv_count': 0, 'tour_count': 1 }
+            field_data[location] = { 'label': name, 'count': count, 'resv_count': 0, 'tour_count': count }
+
+    # Stats Widget
+    reservations_count = sum(datum['resv_count'] for datum in field_data.values())
+    tournaments_count = tournaments.count()
 
     # Pending Widget
-    pending = Reservation.objects.filter(active=True, approved=False).select_related('team', 'team__profile', 'location')[:10]
+    pending = list(Reservation.objects.filter(active=True, approved=False).select_related('team', 'location')[:10])
 
-    context = {
-        'recent_activity': recent_activity,
-        'teams': teams,
+    widgets = {
         'reservations_count': reservations_count,
         'tournaments_count': tournaments_count,
         'field_data': field_data,
         'pending': pending
     }
+    cache.set(key, widgets, DASHBOARD_WIDGETS_TIMEOUT)
 
-    return context
+    return widgets
 
+# How long (in seconds) a window of calendar events is cached
+CALENDAR_EVENTS_TIMEOUT = 60 * 60
 
-def get_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="weekly_games.csv"'
+# The most days of events that are sent at once (a month view shows six weeks)
+CALENDAR_EVENTS_MAX_DAYS = 62
 
+# Feeds the dashboard calendar the events in its visible window [start, end)
+# The calendar asks for reservations or tournaments (of one gametype, or "none" for
+# tournaments without one). Windows are cached, and versioned by the reservations or
+# tournaments, so changes show up right away.
+def calendar_events(request):
+    event_type = request.GET.get('type')
+    gametype = request.GET.get('gametype', "")
+
+    try:
+        start = datetime.strptime(request.GET.get('start', "")[:10], '%Y-%m-%d').date()
+        end = datetime.strptime(request.GET.get('end', "")[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return HttpResponseBadRequest("The start and end dates must be formatted as YYYY-MM-DD.")
+
+    if event_type not in ('reservations', 'tournaments') or not (gametype == "" or gametype == "none" or gametype.isdigit()):
+        return HttpResponseBadRequest("Unknown event type or gametype.")
+    if end <= start or (end - start).days > CALENDAR_EVENTS_MAX_DAYS:
+        return HttpResponseBadRequest("The window must be between 1 and {} days long.".format(CALENDAR_EVENTS_MAX_DAYS))
+
+    key = 'calendar_events:{}:{}:{}:{}:{}'.format(event_type, gametype, start.isoformat(), end.isoformat(), get_cache_version(event_type))
+    events = cache.get(key)
+    if events is None:
+        if event_type == 'reservations':
+            events = get_reservation_events(start, end, gametype)
+        else:
+            events = get_tournament_events(start, end, gametype)
+        cache.set(key, events, CALENDAR_EVENTS_TIMEOUT)
+
+    return JsonResponse(events, safe=False)
+
+def get_reservation_events(start, end, gametype=""):
+    # Every reservation has a gametype
+    if gametype == "none":
+        return []
+
+    reservations = Reservation.objects.filter(active=True, approved=True, date__gte=start, date__lt=end).values_list(
+        'pk', 'date', 'timeslot__start_time', 'timeslot__end_time', 'team_name', 'location__name'
+    )
+    if gametype:
+        reservations = reservations.filter(gametype=gametype)
+
+    events = []
+    for pk, date, start_time, end_time, team_name, location in reservations:
+        events.append({
+            'id': pk,
+            'type': "reservation",
+            # Same as Reservation.__str__
+            'title': "{} @ {}".format(team_name, location),
+            'start': datetime.combine(date, start_time).isoformat(),
+            'end': datetime.combine(date, end_time).isoformat(),
+            'url': reverse('reservation', kwargs={ 'reservation_id': pk })
+        })
+    return events
+
+def get_tournament_events(start, end, gametype=""):
+    tournaments = Tournament.objects.filter(active=True, start_date__lt=end, end_date__gte=start).values_list('pk', 'name', 'start_date', 'end_date', 'gametype__type')
+    if gametype == "none":
+        tournaments = tournaments.filter(gametype__isnull=True)
+    elif gametype:
+        tournaments = tournaments.filter(gametype=gametype)
+
+    events = []
+    for pk, name, start_date, end_date, gametype_name in tournaments:
+        events.append({
+            'id': pk,
+            'type': "tournament",
+            'title': "{} {}".format(gametype_name, name) if gametype_name else name,
+            'start': start_date.isoformat(),
+            # The calendar's all-day ends are exclusive
+            'end': (end_date + timedelta(days=1)).isoformat(),
+            'allDay': True,
+            'url': reverse('tournament', kwargs={ 'tournament_id': pk })
+        })
+    return events
+
+# Pseudo-buffer for csv.writer, so each row is handed straight to the response
+class Echo(object):
+    def write(self, value):
+        return value
+
+def get_csv(request):
     if request.method == 'GET' and 'start_date' in request.GET and 'end_date' in request.GET:
         try:
             start_date = datetime.strptime(request.GET.get('start_date'), '%m/%d/%Y')
@@ -114,51 +199,66 @@ def get_csv(request):
     else:
         bounds = date_bounds(start_bound=int(get_website_setting('CALENDAR_RANGE_START', 0)), end_bound=int(get_website_setting('CALENDAR_RANGE_END', 6)))
 
-    reservations = Reservation.objects.filter(active=True, approved=True, date__range=[bounds['start'], bounds['end']]).select_related('timeslot', 'location', 'team', 'gametype')
-
-    writer = csv.writer(response)
-    writer.writerow(["GameNum", "GameDate", "GameTime", "GameAge", "GameLevel", "Gender", "Location", "HomeTeam", "AwayTeam", "GameDescription", "CrewSize", "CrewDescription", "Notes"])
-    writer.writerow([""])
-
-    if reservations:
-        for reservation in reservations:
-            writer.writerow([
-                reservation.game_number,
-                reservation.date.strftime('%m/%d/%Y'),
-                reservation.timeslot.start_time.strftime('%I:%M %p'),
-                reservation.age,
-                reservation.gametype.type,
-                # TODO: Make this a permanent fix by performing database migrations
-                "Female" if reservation.gender == "girls" else "Male",
-                reservation.location.name,
-                reservation.team.fullname,
-                reservation.game_opponent,
-                "",
-                "",
-                "",
-                ""
-            ])
-    else:
-        writer.writerow(["There are no reservations."])
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in get_csv_rows(bounds)), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="weekly_games.csv"'
 
-    tournaments = Tournament.objects.filter(active=True, start_date__lte=bounds['end'], end_date__gte=bounds['start']).select_related('gametype').prefetch_related('locations')
+    return response
 
-    if tournaments:
-        writer.writerow([""])
-        writer.writerow(["Tournament Name", "Fields", "Start Date", "End Date"])
-        for tournament in tournaments:
-            fields = ", ".join([str(x) for x in tournament.locations.filter(active=True)])
+# Yields the rows of the weekly games csv
+# Rows are read from the database in chunks as they are written, so memory stays flat for any date range.
+def get_csv_rows(bounds, chunk_size=2000):
+    reservations = Reservation.objects.filter(active=True, approved=True, date__range=[bounds['start'], bounds['end']]).values_list(
+        'game_number', 'date', 'timeslot__start_time', 'age', 'gametype__type', 'gender', 'location__name',
+        'team_name', 'game_opponent'
+    )
 
-            if tournament.gametype:
-                name = tournament.gametype.type + " " + tournament.name
-            else:
-                name = tournament.name
+    yield ["GameNum", "GameDate", "GameTime", "GameAge", "GameLevel", "Gender", "Location", "HomeTeam", "AwayTeam", "GameDescription", "CrewSize", "CrewDescription", "Notes"]
+    yield [""]
 
-            writer.writerow([
-                name,
-                fields,
-                tournament.start_date.strftime('%m/%d/%Y'),
-                tournament.end_date.strftime('%m/%d/%Y')
-            ])
+    empty = True
+    for game_number, date, start_time, age, gametype, gender, location, team_name, opponent in reservations.iterator(chunk_size=chunk_size):
+        empty = False
+        yield [
+            game_number,
+            date.strftime('%m/%d/%Y'),
+            start_time.strftime('%I:%M %p'),
+            age,
+            gametype,
+            # TODO: Make this a permanent fix by performing database migrations
+            "Female" if gender == "girls" else "Male",
+            location,
+            team_name,
+            opponent,
+            "",
+            "",
+            "",
+            ""
+        ]
+    if empty:
+        yield ["There are no reservations."]
 
-    return response
+    tournaments = Tournament.objects.filter(active=True, start_date__lte=bounds['end'], end_date__gte=bounds['start']).select_related('gametype').prefetch_related(
+        Prefetch('locations', queryset=Field.objects.filter(active=True).only('name'), to_attr='active_locations')
+    )
+
+    header = False
+    for tournament in tournaments.iterator(chunk_size=chunk_size):
+        if not header:
+            header = True
+            yield [""]
+            yield ["Tournament Name", "Fields", "Start Date", "End Date"]
+
+        fields = ", ".join([str(x) for x in tournament.active_locations])
+
+        if tournament.gametype:
+            name = tournament.gametype.type + " " + tournament.name
+        else:
+            name = tournament.name
+
+        yield [
+            name,
+            fields,
+            tournament.start_date.strftime('%m/%d/%Y'),
+            tournament.end_date.strftime('%m/%d/%Y')
+        ]
@@ -15,6 +15,11 @@ from django.contrib.auth.models import User
 from reservations.models import Reservation, GameType, Field, TimeSlot, Tournament
 from reservations.forms import EditorStep1Form, EditorStep2Form
 from reservations.utils import has_reservation_block
+from reservations.holds import acquire_hold, get_hold_message
+from reservations.overlap import save_reservation
+
+# Shown when another team booked an overlapping timeslot first (see reservations.overlap.save_reservation)
+CONFLICT_MESSAGE = "This timeslot has already been reserved. Please choose another timeslot!"
 
 @login_required
 def editor_step1(request):
@@ -52,7 +57,6 @@ def editor_step1(request):
     return render(request, 'reservations/general/editor/step1.html', { 'form': form, 'type': request.session.get('resv_tokentype', None) })
 
 @login_required
-@token_required()
 def editor_step2(request):
     if request.session.get('resv_step', -1) < 2:
         return redirect('editor_step1')
@@ -67,6 +71,14 @@ def editor_step2(request):
             if not form.populate_session(request):
                 messages.error(request, "There was something wrong with the reservation data. Try completing the form again!")
                 return redirect('editor_step1')
+
+            # Hold this field for the date while they finish the reservation
+            resv_date = datetime.strptime(request.session.get('resv_date'), "%m/%d/%Y").date()
+            acquired, hold = acquire_hold(request.user, resv_date, request.session.get('resv_location'))
+            if not acquired:
+                messages.warning(request, get_hold_message(hold))
+                return redirect('editor_step2')
+
             request.session['resv_step'] = 3
 
             # People in edit mode don't need a confirmation page.
@@ -138,11 +150,6 @@ def editor_complete(request):
         messages.error(request, "You cannot create/modify a reservation on this date, because today's date is too close to it. Please choose another timeslot! (Note: This time conflict is not supposed to occur. Please tell an administrator about this event!)")
         return redirect('editor_step1')
 
-    # Is this timeslot even avaliable?
-    if context['timeslot'].reservation_set.filter(active=True, date=context['date']).exclude(pk=request.session.get('resv_id', -1)).count() > 0:
-        messages.error(request, "This timeslot has already been reserved. Please choose another timeslot! (Note: This time conflict is not supposed to occur. Please tell an administrator about this event!)")
-        return redirect('editor_step2')
-
     # Does this team have permission to use this game type?
     # TODO
     # if False:
@@ -172,6 +179,14 @@ def editor_complete(request):
         reservation.gender = context['gender']
         reservation.age = context['age']
 
+        if not is_superuser(request.user):
+            reservation.approved = False
+
+        # Is this timeslot even avaliable?
+        if not save_reservation(reservation):
+            messages.error(request, CONFLICT_MESSAGE)
+            return redirect('editor_step2')
+
         if not is_superuser(request.user):
             # Only email if they're not a superuser
             # First, check if they are a manager. If they are not a manager, email the team.
@@ -181,19 +196,20 @@ def editor_complete(request):
                 send_email("Modified Reservation: {}".format(reservation), 'reservations/email/edit_reservation.html', { 'reservation': reservation }, [reservation.team.email])
 
             send_email_superusers("Modified Reservation: {}".format(reservation), 'reservations/email/approve_reservation_edit.html', { 'reservation': reservation, 'link': reverse('all_reservations') })
-            reservation.approved = False
 
             messages.success(request, "Saved reservation <b>{}</b>! This reservation will have to be reapproved.".format(escape(str(reservation))))
         else:
             messages.success(request, "Saved reservation <b>{}</b>!".format(escape(str(reservation))))
 
-        reservation.save()
-
         # Log change to admin
         log_message(request, reservation, CHANGE, "Modified Reservation: {} on {}".format(reservation, reservation.date.strftime('%m/%d/%Y')))
     else:
         reservation = Reservation(**context)
-        reservation.save()
+
+        # Is this timeslot even avaliable?
+        if not save_reservation(reservation):
+            messages.error(request, CONFLICT_MESSAGE)
+            return redirect('editor_step2')
 
         # Log addition to admin
         log_message(request, reservation, ADDITION, "New Reservation: {} on {}".format(reservation, reservation.date.strftime('%m/%d/%Y')))
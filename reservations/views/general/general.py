@@ -13,6 +13,7 @@ from reservations.decorators import can_edit_reservation
 from reservations.utils import clear_tokens, log_message, has_reservation_block
 
 from reservations.models import Reservation, Tournament
+from reservations.overlap import save_reservation
 
 def four_oh_four(request):
     return render(request, 'reservations/general/404.html')
@@ -57,13 +58,11 @@ def delete_reservation(request, reservation_id):
 def recovery_reservation(request, reservation_id):
     reservation = get_object_or_404(Reservation, pk=reservation_id)
 
-    if (Reservation.objects.filter(active=True, date=reservation.date, timeslot=reservation.timeslot).count() > 1
-        or Tournament.objects.filter(active=True, start_date__lte=reservation.date, end_date__gte=reservation.date, locations=reservation.location)):
+    reservation.active = True
+    if (Tournament.objects.filter(active=True, start_date__lte=reservation.date, end_date__gte=reservation.date, locations=reservation.location).exists()
+        or not save_reservation(reservation)):
         messages.error(request, "This reservation overlaps with another reservation/tournament! It can not be recovered.")
     else:
-        reservation.active = True
-        reservation.save()
-
         log_message(request, reservation, CHANGE, "Recovered Reservation: {} on {}".format(reservation, reservation.date.strftime('%m/%d/%Y')))
         messages.success(request, "The reservation <b>{}</b> was recovered!".format(escape(str(reservation))))
     return redirect(request.META.get('HTTP_REFERER', '/'))